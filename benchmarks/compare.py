@@ -0,0 +1,37 @@
+"""
+Compare two benchmark result files.
+
+    python -m benchmarks.compare before.json after.json
+"""
+
+import json
+import sys
+
+
+def load_results(path):
+    with open(path) as results_file:
+        results = json.load(results_file)["results"]
+    return {(result["name"], json.dumps(result["scale"], sort_keys=True)): result for result in results}
+
+
+def main():
+    if len(sys.argv) != 3:
+        print(__doc__)
+        raise SystemExit(1)
+
+    before = load_results(sys.argv[1])
+    after = load_results(sys.argv[2])
+
+    for key in before:
+        if key not in after:
+            continue
+        name, scale = key
+        median_before = before[key]["seconds"]["median"]
+        median_after = after[key]["seconds"]["median"]
+        change = (median_after - median_before) / median_before * 100 if median_before else 0.0
+        print(f"{name:40} {scale:28} {median_before * 1000:10.2f} ms -> {median_after * 1000:10.2f} ms "
+              f"({change:+.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
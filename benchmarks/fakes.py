@@ -0,0 +1,251 @@
+"""
+Stand-ins for Discord, the osu! API clients and RSS hosts, so the cogs can run a pass without a network.
+All data is synthetic and moves forward one "generation" at a time, every generation brings new items.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from youmu.modules import settings
+from youmu.modules.cache import AsyncTTLCache
+from youmu.modules.clock import Clock
+from youmu.modules.dispatcher import PostDispatcher
+from youmu.modules.feed_parsing import FeedParserPool
+from youmu.modules.rate_limiter import RateLimiter
+from youmu.modules.routing import SubscriptionRouter
+
+
+class FakeChannel:
+    def __init__(self, channel_id, latency=0.0):
+        self.id = channel_id
+        self.latency = latency
+        self.sent = 0
+
+    async def send(self, content=None, *, embed=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.sent += 1
+        return SimpleNamespace(id=self.sent, channel=self, content=content, embed=embed)
+
+
+def to_namespace(data):
+    """
+    Turn JSON-like data into objects with attributes, the way aioosuapi returns them.
+    """
+
+    if isinstance(data, dict):
+        return SimpleNamespace(**{key: to_namespace(value) for key, value in data.items()})
+    if isinstance(data, list):
+        return [to_namespace(value) for value in data]
+    return data
+
+
+def make_user(user_id, generation, events_per_generation):
+    # the events of this generation and the one before, like event_days does
+    events = []
+    for event_generation in range(max(0, generation - 1), generation + 1):
+        for number in range(events_per_generation):
+            event_id = (user_id * 1000 + event_generation) * 100 + number
+            events.append({
+                "id": event_id,
+                "display_text": f"<b>user {user_id}</b> has submitted the beatmap <a>set {event_id}</a>",
+                "beatmapset_id": event_id % 5000,
+            })
+    return {"id": user_id, "user_id": user_id, "name": f"user {user_id}", "username": f"user {user_id}",
+            "country": "JP", "events": events}
+
+
+def make_beatmapset(mapset_id):
+    return {
+        "beatmaps": [{"difficulty_rating": stars, "difficultyrating": stars,
+                      "version": f"Insane {stars}", "gamemode": "osu"} for stars in (2.5, 4.1, 5.3)],
+        "artist": "Artist", "title": f"Song {mapset_id}", "url": f"https://osu.ppy.sh/beatmapsets/{mapset_id}",
+        "creator": "Mapper", "creator_id": 2, "thumb": f"https://b.ppy.sh/thumb/{mapset_id}l.jpg", "source": "",
+    }
+
+
+def make_ranked_listing(generation, mapsets_per_generation, listing_size):
+    newest = listing_size + generation * mapsets_per_generation
+    return {"beatmapsets": [make_mapset_array(mapset_id)
+                            for mapset_id in range(newest, newest - listing_size, -1)]}
+
+
+def make_group_roster(group_id, generation, roster_size, roster_churn):
+    first = int(group_id) * 10000000 + generation * roster_churn
+    return [{"id": osu_id, "username": f"member {osu_id}", "country": {"code": "PL"}}
+            for osu_id in range(first, first + roster_size)]
+
+
+class FakeOsuApi:
+    """
+    aioosuapi (osu! API v1) with `events_per_generation` new events per user per generation.
+    """
+
+    def __init__(self, events_per_generation=2, latency=0.0):
+        self.generation = 0
+        self.events_per_generation = events_per_generation
+        self.latency = latency
+
+    async def get_user(self, u, event_days=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return to_namespace(make_user(int(u), self.generation, self.events_per_generation))
+
+    async def get_beatmapset(self, s):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return to_namespace(make_beatmapset(int(s)))
+
+    async def close(self):
+        pass
+
+
+def make_mapset_array(mapset_id, difficulties=5):
+    return {
+        "id": mapset_id, "status": "ranked", "artist": "Artist", "title": f"Song {mapset_id}",
+        "creator": "Mapper", "user_id": 2, "source": "",
+        "beatmaps": [{"difficulty_rating": 1.5 + number, "version": f"Diff {number}", "mode": "osu"}
+                     for number in range(difficulties)],
+    }
+
+
+class FakeOsuWebApi:
+    """
+    aioosuwebapi (osu! API v2).
+    The ranked listing gets `mapsets_per_generation` new mapsets per generation.
+    Group rosters are `roster_size` members, with `roster_churn` of them replaced per generation.
+    """
+
+    def __init__(self, mapsets_per_generation=5, listing_size=50, roster_size=500, roster_churn=5, latency=0.0):
+        self.generation = 0
+        self.mapsets_per_generation = mapsets_per_generation
+        self.listing_size = listing_size
+        self.roster_size = roster_size
+        self.roster_churn = roster_churn
+        self.latency = latency
+
+    async def scrape_latest_ranked_beatmapsets_array(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return make_ranked_listing(self.generation, self.mapsets_per_generation, self.listing_size)
+
+    async def scrape_group_members_array(self, group_id):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return make_group_roster(group_id, self.generation, self.roster_size, self.roster_churn)
+
+    async def close(self):
+        pass
+
+
+def make_rss_document(url, generation, entries_per_generation, feed_size):
+    newest = feed_size + generation * entries_per_generation
+    items = "".join(
+        f"<item><title>Entry {number}</title><link>{url}/entries/{number}</link>"
+        f"<description>&lt;p&gt;Entry {number} of {url}&lt;/p&gt;</description>"
+        f"<pubDate>Mon, 01 Jan 2024 00:00:00 +0000</pubDate></item>"
+        for number in range(newest, newest - feed_size, -1)
+    )
+    return f"<?xml version=\"1.0\"?><rss version=\"2.0\"><channel><title>{url}</title><ttl>30</ttl>" \
+           f"{items}</channel></rss>"
+
+
+class FakeStreamReader:
+    def __init__(self, body):
+        self.body = body
+
+    async def iter_chunked(self, size):
+        for offset in range(0, len(self.body), size):
+            yield self.body[offset:offset + size]
+
+
+class FakeResponse:
+    def __init__(self, status, body=b"", headers=None, latency=0.0):
+        self.latency = latency
+        self.status = status
+        self.headers = headers or {}
+        self.content = FakeStreamReader(body)
+        self.content_length = len(body)
+        self.charset = "utf-8"
+
+    async def __aenter__(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+class FakeHttpSession:
+    """
+    Serves a synthetic RSS document for any URL, `entries_per_generation` new entries per generation.
+    """
+
+    def __init__(self, entries_per_generation=2, feed_size=50, latency=0.0):
+        self.generation = 0
+        self.entries_per_generation = entries_per_generation
+        self.feed_size = feed_size
+        self.latency = latency
+
+    def get(self, url, headers=None):
+        body = make_rss_document(url, self.generation, self.entries_per_generation, self.feed_size).encode()
+        return FakeResponse(200, body, {"Content-Type": "application/rss+xml"}, self.latency)
+
+    async def close(self):
+        pass
+
+
+class FakeBot:
+    """
+    Just enough of the Youmu bot for the cogs: the shared services are the real ones,
+    Discord and the upstream APIs are fakes. The cogs' background loops never start,
+    wait_until_ready() does not return.
+    """
+
+    def __init__(self, db, channel_latency=0.0, clock=None):
+        self.loop = asyncio.get_event_loop()
+        self.clock = clock or Clock()
+        self.background_tasks = []
+        self.db = db
+        self.channels = {}
+        self.channel_latency = channel_latency
+        self.osu = FakeOsuApi()
+        self.osuweb = FakeOsuWebApi()
+        self.osuweb_limiter = RateLimiter(settings.osuweb_rate, settings.osuweb_per)
+        self.http_session = FakeHttpSession()
+        self.post_dispatcher = PostDispatcher()
+        self.feed_parser = FeedParserPool()
+        self.beatmapset_cache = AsyncTTLCache(settings.beatmapset_cache_size, settings.beatmapset_cache_ttl)
+        self.subscriptions = SubscriptionRouter()
+        self.ready = asyncio.Event()
+
+    def advance(self):
+        """
+        Move every fake upstream to the next generation.
+        """
+
+        self.osu.generation += 1
+        self.osuweb.generation += 1
+        self.http_session.generation += 1
+
+    def get_channel(self, channel_id):
+        if channel_id not in self.channels:
+            self.channels[channel_id] = FakeChannel(channel_id, self.channel_latency)
+        return self.channels[channel_id]
+
+    def messages_sent(self):
+        return sum(channel.sent for channel in self.channels.values())
+
+    async def wait_until_ready(self):
+        await self.ready.wait()
+
+    def is_closed(self):
+        return False
+
+    async def close(self):
+        for task in self.background_tasks:
+            task.cancel()
+        await self.post_dispatcher.close()
+        self.feed_parser.close()
+        await self.db.close()
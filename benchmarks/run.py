@@ -0,0 +1,269 @@
+"""
+Offline benchmarks for the feed hot paths.
+Every cog pass runs against the real database layer, dispatcher and parser, with Discord and osu! faked out.
+
+    python -m benchmarks.run --scale 10 100 1000 --passes 3 --output before.json
+
+Compare two runs with `python -m benchmarks.compare before.json after.json`.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def prepare_environment(data_dir):
+    """
+    Settings are read at import time, so this has to run before anything from youmu is imported.
+    """
+
+    os.environ["YOUMU_DATA_DIR"] = data_dir
+    # measure the bot, not Discord's or osu!'s rate limits
+    os.environ.setdefault("YOUMU_DISPATCH_CHANNEL_RATE", "1000000000")
+    os.environ.setdefault("YOUMU_DISPATCH_GLOBAL_RATE", "1000000000")
+    os.environ.setdefault("YOUMU_OSUWEB_RATE", "1000000000")
+
+
+def summarize(name, scale, durations, items_per_pass, extra=None):
+    result = {
+        "name": name,
+        "scale": scale,
+        "passes": len(durations),
+        "seconds": {
+            "min": min(durations),
+            "median": statistics.median(durations),
+            "mean": statistics.mean(durations),
+            "max": max(durations),
+        },
+        "items_per_pass": items_per_pass,
+        "items_per_second": items_per_pass / statistics.median(durations) if statistics.median(durations) else None,
+    }
+    result.update(extra or {})
+    return result
+
+
+class Benchmarks:
+    def __init__(self, data_dir, passes, verbose=False):
+        self.data_dir = data_dir
+        self.passes = passes
+        self.verbose = verbose
+        self.database_count = 0
+
+    @contextlib.contextmanager
+    def quiet(self):
+        # the cogs log every feed and user they check
+        if self.verbose:
+            yield
+            return
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+
+    async def make_bot(self):
+        from benchmarks.fakes import FakeBot
+        from youmu.modules import history
+        from youmu.modules import migrations
+        from youmu.modules.database import Database
+
+        self.database_count += 1
+        database_file = os.path.join(self.data_dir, f"benchmark{self.database_count}.sqlite3")
+        conn = sqlite3.connect(database_file)
+        migrations.upgrade(conn)
+        conn.close()
+
+        db = await Database.connect(database_file)
+        await history.load_seen_sets(db)
+        return FakeBot(db)
+
+    async def timed_passes(self, bot, run_pass):
+        """
+        One untimed pass to fill the history, then self.passes timed passes, each with new upstream data.
+        """
+
+        with self.quiet():
+            await run_pass()
+            await bot.db.flush()
+
+        durations = []
+        messages_before = bot.messages_sent()
+        for _ in range(self.passes):
+            bot.advance()
+            with self.quiet():
+                started_at = time.perf_counter()
+                await run_pass()
+                await bot.db.flush()
+                durations.append(time.perf_counter() - started_at)
+        return durations, (bot.messages_sent() - messages_before) / self.passes
+
+    async def rssfeed_pass(self, feeds):
+        from youmu.cogs.RSSFeed import RSSFeed
+
+        bot = await self.make_bot()
+        cog = RSSFeed(bot)
+        # spread over hosts, like real feeds, so the per-host limit does not serialize everything
+        urls = [f"https://feeds{number % 50}.example.com/{number}.xml" for number in range(feeds)]
+        for number, url in enumerate(urls):
+            bot.subscriptions.add("rss", url, 1000 + number % 100)
+
+        durations, messages = await self.timed_passes(bot, lambda: cog.check_feeds(urls))
+        await bot.close()
+        return summarize("rssfeed_pass", {"feeds": feeds}, durations, feeds, {"messages_per_pass": messages})
+
+    async def usereventfeed_pass(self, users):
+        from youmu.cogs.UserEventFeed import UserEventFeed
+
+        bot = await self.make_bot()
+        cog = UserEventFeed(bot)
+        user_ids = list(range(1, users + 1))
+        for user_id in user_ids:
+            bot.subscriptions.add("uef", user_id, 2000 + user_id % 100)
+
+        durations, messages = await self.timed_passes(bot, lambda: cog.check_users(user_ids))
+        await bot.close()
+        return summarize("usereventfeed_pass", {"users": users}, durations, users, {"messages_per_pass": messages})
+
+    async def rankfeed_pass(self, channels):
+        from youmu.cogs.RankFeed import RankFeed
+
+        bot = await self.make_bot()
+        cog = RankFeed(bot)
+        channel_list = set(range(3000, 3000 + channels))
+
+        durations, messages = await self.timed_passes(bot, lambda: cog.check_ranked(channel_list))
+        await bot.close()
+        return summarize("rankfeed_pass", {"channels": channels}, durations, channels,
+                         {"messages_per_pass": messages})
+
+    async def groupfeed_pass(self, roster_size):
+        from youmu.cogs.GroupFeed import GroupFeed
+
+        bot = await self.make_bot()
+        bot.osuweb.roster_size = roster_size
+        cog = GroupFeed(bot)
+        channel_list = {4000}
+
+        durations, messages = await self.timed_passes(bot, lambda: cog.check_groups(channel_list))
+        await bot.close()
+        return summarize("groupfeed_pass", {"roster_size": roster_size}, durations,
+                         roster_size * len(cog.group_list), {"messages_per_pass": messages})
+
+    async def beatmapset_array_embed(self, difficulties):
+        from benchmarks.fakes import make_mapset_array
+        from youmu.embeds import newembeds
+
+        mapset = make_mapset_array(1, difficulties)
+        calls = 1000
+        durations = []
+        for _ in range(self.passes):
+            started_at = time.perf_counter()
+            for _ in range(calls):
+                await newembeds.beatmapset_array(mapset)
+            durations.append(time.perf_counter() - started_at)
+        return summarize("newembeds.beatmapset_array", {"difficulties": difficulties}, durations, calls)
+
+    async def send_large_message_chunking(self, lines):
+        from benchmarks.fakes import FakeChannel
+        from youmu.reusables import send_large_message
+
+        contents = "".join(f"url: `https://example.com/feed/{number}.xml` | channels: <#{number}>\n"
+                           for number in range(lines))
+        durations = []
+        for _ in range(self.passes):
+            channel = FakeChannel(1)
+            started_at = time.perf_counter()
+            await send_large_message.send_large_text(channel, contents)
+            durations.append(time.perf_counter() - started_at)
+        return summarize("send_large_message.send_large_text", {"lines": lines}, durations, lines,
+                         {"messages_per_pass": channel.sent})
+
+    async def history_dedup(self, ids):
+        from youmu.modules import history
+
+        bot = await self.make_bot()
+        # half of the IDs are in the history already
+        await history.record_seen(bot.db, "rankfeed_history", [(mapset_id,) for mapset_id in range(0, ids * 2, 2)])
+        await bot.db.flush()
+        await history.load_seen_sets(bot.db)
+
+        durations = []
+        for _ in range(self.passes):
+            started_at = time.perf_counter()
+            await history.filter_unseen(bot.db, "rankfeed_history", "mapset_id", list(range(ids)))
+            durations.append(time.perf_counter() - started_at)
+        await bot.close()
+        return summarize("history.filter_unseen", {"ids": ids}, durations, ids)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+async def run_benchmarks(benchmarks, scales, only):
+    suite = [
+        ("rssfeed_pass", benchmarks.rssfeed_pass, scales),
+        ("usereventfeed_pass", benchmarks.usereventfeed_pass, scales),
+        ("rankfeed_pass", benchmarks.rankfeed_pass, scales),
+        ("groupfeed_pass", benchmarks.groupfeed_pass, [scale * 10 for scale in scales]),
+        ("newembeds.beatmapset_array", benchmarks.beatmapset_array_embed, [5, 20]),
+        ("send_large_message.send_large_text", benchmarks.send_large_message_chunking,
+         [scale * 10 for scale in scales]),
+        ("history.filter_unseen", benchmarks.history_dedup, [scale * 10 for scale in scales]),
+    ]
+
+    results = []
+    for name, benchmark, benchmark_scales in suite:
+        if only and not any(selected in name for selected in only):
+            continue
+        for scale in benchmark_scales:
+            result = await benchmark(scale)
+            print(f"{name:40} {json.dumps(result['scale']):28} "
+                  f"median {result['seconds']['median'] * 1000:10.2f} ms  "
+                  f"{result['items_per_second'] or 0:12.1f} items/s")
+            results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for Youmu's feed hot paths")
+    parser.add_argument("--scale", type=int, nargs="+", default=[10, 100, 1000],
+                        help="feeds, users and channels per run")
+    parser.add_argument("--passes", type=int, default=3, help="timed passes per benchmark")
+    parser.add_argument("--only", nargs="*", help="only run benchmarks whose name contains one of these")
+    parser.add_argument("--output", default="benchmark-results.json", help="where to write the results")
+    parser.add_argument("--verbose", action="store_true", help="show what the cogs print")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        prepare_environment(data_dir)
+        benchmarks = Benchmarks(data_dir, args.passes, args.verbose)
+        results = asyncio.get_event_loop().run_until_complete(run_benchmarks(benchmarks, args.scale, args.only))
+
+    output = {
+        "meta": {
+            "timestamp": int(time.time()),
+            "git_revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "passes": args.passes,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as output_file:
+        json.dump(output, output_file, indent=2)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Run the real background loops against the stand-in server on an accelerated clock.
+A simulated day of polling takes seconds, so scheduling and throughput changes can be checked reproducibly.
+
+    python -m benchmarks.simulate --hours 24 --speed 3600 --feeds 100 --users 100 --output day.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from benchmarks.run import git_revision
+from benchmarks.run import prepare_environment
+
+
+async def seed_database(db, base_url, feeds, users, channels):
+    await db.executemany("INSERT INTO rssfeed_tracklist VALUES (?)",
+                         [(f"{base_url}/rss/feed{number}.xml",) for number in range(feeds)])
+    await db.executemany("INSERT INTO rssfeed_channels VALUES (?, ?)",
+                         [(f"{base_url}/rss/feed{number}.xml", 1000 + number % channels) for number in range(feeds)])
+    await db.executemany("INSERT INTO usereventfeed_tracklist VALUES (?)",
+                         [(user_id,) for user_id in range(1, users + 1)])
+    await db.executemany("INSERT INTO usereventfeed_channels VALUES (?, ?)",
+                         [(user_id, 2000 + user_id % channels) for user_id in range(1, users + 1)])
+    await db.executemany("INSERT INTO rankfeed_channel_list VALUES (?)",
+                         [(3000 + number,) for number in range(channels)])
+    # the rankfeed loop does not post anything until there is some history
+    await db.execute("INSERT INTO rankfeed_history VALUES (?)", [0])
+    await db.executemany("INSERT INTO groupfeed_channel_list VALUES (?)",
+                         [(4000 + number,) for number in range(channels)])
+    await db.flush()
+
+
+async def simulate(args, data_dir):
+    from benchmarks.fakes import FakeBot
+    from benchmarks.standin import StandInOsuApi
+    from benchmarks.standin import StandInOsuWebApi
+    from benchmarks.standin import StandInServer
+    from youmu.cogs.DatabaseMaintenance import DatabaseMaintenance
+    from youmu.cogs.GroupFeed import GroupFeed
+    from youmu.cogs.RankFeed import RankFeed
+    from youmu.cogs.RSSFeed import RSSFeed
+    from youmu.cogs.UserEventFeed import UserEventFeed
+    from youmu.modules import history
+    from youmu.modules import http_client
+    from youmu.modules import metrics
+    from youmu.modules import migrations
+    from youmu.modules.clock import ScaledClock
+    from youmu.modules.database import Database
+
+    clock = ScaledClock(args.speed)
+    server = StandInServer(clock=clock, fixtures=args.fixtures, latency=args.latency,
+                           error_rate=args.error_rate, seed=args.seed)
+    await server.start(port=args.port)
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    database_file = os.path.join(data_dir, "simulation.sqlite3")
+    conn = sqlite3.connect(database_file)
+    migrations.upgrade(conn)
+    conn.close()
+
+    db = await Database.connect(database_file)
+    bot = FakeBot(db, clock=clock)
+    bot.http_session = http_client.create_session()
+    bot.osu = StandInOsuApi(bot.http_session, base_url)
+    bot.osuweb = StandInOsuWebApi(bot.http_session, base_url)
+    try:
+        await seed_database(db, base_url, args.feeds, args.users, args.channels)
+        await bot.subscriptions.load(db)
+        await history.load_seen_sets(db)
+
+        output = io.StringIO()
+        started_at = time.monotonic()
+        with contextlib.redirect_stdout(sys.stdout if args.verbose else output):
+            for cog in (RSSFeed, UserEventFeed, RankFeed, GroupFeed, DatabaseMaintenance):
+                cog(bot)
+            bot.ready.set()
+            await clock.sleep(args.hours * 3600)
+            for task in bot.background_tasks:
+                task.cancel()
+            await asyncio.gather(*bot.background_tasks, return_exceptions=True)
+        elapsed = time.monotonic() - started_at
+
+        return {
+            "simulated_hours": args.hours,
+            "real_seconds": elapsed,
+            "messages_sent": bot.messages_sent(),
+            "upstream_requests": server.requests,
+            "injected_errors": server.injected_errors,
+            "loop_passes": {loop: metrics.loop_pass_seconds.count(loop)
+                            for loop in ("rssfeed", "usereventfeed", "rankfeed", "groupfeed", "retention")},
+        }
+    finally:
+        await bot.http_session.close()
+        await bot.close()
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate Youmu's feed loops against the stand-in server")
+    parser.add_argument("--hours", type=float, default=24, help="simulated hours")
+    parser.add_argument("--speed", type=float, default=3600, help="simulated seconds per real second")
+    parser.add_argument("--feeds", type=int, default=50)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--channels", type=int, default=10)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--fixtures", help="folder with recorded fixtures, see benchmarks.standin")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="simulation-results.json")
+    parser.add_argument("--verbose", action="store_true", help="show what the cogs print")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        prepare_environment(data_dir)
+        result = asyncio.get_event_loop().run_until_complete(simulate(args, data_dir))
+
+    result["meta"] = {"timestamp": int(time.time()), "git_revision": git_revision(), "arguments": vars(args)}
+    with open(args.output, "w") as output_file:
+        json.dump(result, output_file, indent=2)
+    print(json.dumps({key: value for key, value in result.items() if key != "meta"}, indent=2))
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
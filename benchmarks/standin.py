@@ -0,0 +1,187 @@
+"""
+A local stand-in for osu! and RSS hosts, for load tests and simulations.
+It serves the data the bot asks for (get_user, get_beatmapset, the ranked listing, group rosters and RSS feeds)
+from recorded fixtures where there are any, and synthetic data otherwise.
+Latency and an error rate can be injected. Synthetic data moves forward one generation per
+`generation_interval` seconds of the given clock, so an accelerated clock also speeds up the upstream.
+
+    python -m benchmarks.standin --port 8089 --latency 0.05 --error-rate 0.01 --fixtures recorded/
+
+Fixtures, all optional:
+    users/<osu_id>.json, beatmapsets/<mapset_id>.json, ranked.json, groups/<group_id>.json, rss/<name>.xml
+
+The bot's osu! clients can not be pointed at another host, so StandInOsuApi and StandInOsuWebApi
+take their place in a simulation, talking to the stand-in over HTTP.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+
+from aiohttp import web
+
+from benchmarks.fakes import make_beatmapset
+from benchmarks.fakes import make_group_roster
+from benchmarks.fakes import make_ranked_listing
+from benchmarks.fakes import make_rss_document
+from benchmarks.fakes import make_user
+from benchmarks.fakes import to_namespace
+from youmu.modules.clock import Clock
+
+
+class StandInServer:
+    def __init__(self, clock=None, fixtures=None, latency=0.0, error_rate=0.0, seed=0,
+                 generation_interval=3600, events_per_generation=2, mapsets_per_generation=5,
+                 roster_size=500, roster_churn=5, entries_per_generation=2, feed_size=50):
+        self.clock = clock or Clock()
+        self.fixtures = fixtures
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.generation_interval = generation_interval
+        self.started_at = self.clock.time()
+        self.events_per_generation = events_per_generation
+        self.mapsets_per_generation = mapsets_per_generation
+        self.roster_size = roster_size
+        self.roster_churn = roster_churn
+        self.entries_per_generation = entries_per_generation
+        self.feed_size = feed_size
+        self.requests = 0
+        self.injected_errors = 0
+        self.runner = None
+
+    @property
+    def generation(self):
+        return int((self.clock.time() - self.started_at) / self.generation_interval)
+
+    def load_fixture(self, *path):
+        if not self.fixtures:
+            return None
+        fixture_path = os.path.join(self.fixtures, *path)
+        if not os.path.isfile(fixture_path):
+            return None
+        with open(fixture_path, "r", encoding="utf-8") as fixture_file:
+            if fixture_path.endswith(".json"):
+                return json.load(fixture_file)
+            return fixture_file.read()
+
+    @web.middleware
+    async def inject_faults(self, request, handler):
+        self.requests += 1
+        if self.latency:
+            # network latency is not scaled by the clock
+            await asyncio.sleep(self.latency * self.random.uniform(0.5, 1.5))
+        if self.random.random() < self.error_rate:
+            self.injected_errors += 1
+            return web.Response(status=503, text="injected error")
+        return await handler(request)
+
+    async def get_user(self, request):
+        user_id = int(request.query["u"])
+        user = self.load_fixture("users", f"{user_id}.json")
+        return web.json_response(user or make_user(user_id, self.generation, self.events_per_generation))
+
+    async def get_beatmapset(self, request):
+        mapset_id = int(request.query["s"])
+        mapset = self.load_fixture("beatmapsets", f"{mapset_id}.json")
+        return web.json_response(mapset or make_beatmapset(mapset_id))
+
+    async def ranked_beatmapsets(self, request):
+        listing = self.load_fixture("ranked.json")
+        return web.json_response(listing or make_ranked_listing(self.generation, self.mapsets_per_generation, 50))
+
+    async def group_members(self, request):
+        group_id = int(request.match_info["group_id"])
+        roster = self.load_fixture("groups", f"{group_id}.json")
+        return web.json_response(roster or make_group_roster(group_id, self.generation,
+                                                             self.roster_size, self.roster_churn))
+
+    async def rss_feed(self, request):
+        name = request.match_info["name"]
+        document = self.load_fixture("rss", f"{name}.xml")
+        if not document:
+            document = make_rss_document(f"http://{request.host}{request.path}", self.generation, self.entries_per_generation,
+                                         self.feed_size)
+        return web.Response(text=document, content_type="application/rss+xml")
+
+    def make_app(self):
+        app = web.Application(middlewares=[self.inject_faults])
+        app.router.add_get("/osu/v1/get_user", self.get_user)
+        app.router.add_get("/osu/v1/get_beatmapset", self.get_beatmapset)
+        app.router.add_get("/osu/v2/beatmapsets/ranked", self.ranked_beatmapsets)
+        app.router.add_get("/osu/v2/groups/{group_id}", self.group_members)
+        app.router.add_get("/rss/{name}.xml", self.rss_feed)
+        return app
+
+    async def start(self, host="127.0.0.1", port=8089):
+        self.runner = web.AppRunner(self.make_app())
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+
+class StandInOsuApi:
+    """
+    Takes the place of aioosuapi, backed by the stand-in server.
+    """
+
+    def __init__(self, session, base_url):
+        self.session = session
+        self.base_url = base_url
+
+    async def request(self, path, **params):
+        async with self.session.get(f"{self.base_url}{path}", params=params) as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def get_user(self, u, event_days=None):
+        return to_namespace(await self.request("/osu/v1/get_user", u=str(u)))
+
+    async def get_beatmapset(self, s):
+        return to_namespace(await self.request("/osu/v1/get_beatmapset", s=str(s)))
+
+    async def close(self):
+        pass
+
+
+class StandInOsuWebApi(StandInOsuApi):
+    """
+    Takes the place of aioosuwebapi, backed by the stand-in server.
+    """
+
+    async def scrape_latest_ranked_beatmapsets_array(self):
+        return await self.request("/osu/v2/beatmapsets/ranked")
+
+    async def scrape_group_members_array(self, group_id):
+        return await self.request(f"/osu/v2/groups/{int(group_id)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for osu! and RSS hosts")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--fixtures", help="folder with recorded fixtures")
+    parser.add_argument("--latency", type=float, default=0.0, help="average response latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 503")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = StandInServer(fixtures=args.fixtures, latency=args.latency, error_rate=args.error_rate, seed=args.seed)
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(server.start(args.host, args.port))
+    print(f"stand-in listening on http://{args.host}:{args.port}")
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(server.stop())
+
+
+if __name__ == "__main__":
+    main()
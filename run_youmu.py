@@ -1,3 +1,5 @@
 #!/usr/bin/env python3
 
-import youmu.__main__
+# feed parser workers import this script again, they must not start a second bot
+if __name__ == "__main__":
+    import youmu.__main__
@@ -0,0 +1,44 @@
+from youmu.modules.feed_parsing import new_entries_first
+from youmu.modules.feed_parsing import parse_feed
+
+
+def feed_document(links):
+    items = "".join(f"<item><title>{link}</title><link>{link}</link></item>" for link in links)
+    return f"<rss version=\"2.0\"><channel><title>feed</title>{items}</channel></rss>"
+
+
+def parsed_links(parsed_feed):
+    return [entry["link"] for entry in parsed_feed[0]]
+
+
+def test_parse_stops_at_the_previous_newest_entry():
+    parsed_feed = parse_feed(feed_document(["x", "a", "b", "c", "d"]), ("a", frozenset("abcd")))
+
+    assert parsed_links(parsed_feed) == ["x", "a", "b", "c"]
+    assert parsed_feed[3] is False
+
+
+def test_parse_without_feed_head_reads_everything():
+    parsed_feed = parse_feed(feed_document(["a", "b", "c", "d"]))
+
+    assert parsed_links(parsed_feed) == ["a", "b", "c", "d"]
+    assert parsed_feed[3] is True
+
+
+def test_parse_does_not_stop_at_seen_entries_that_were_not_newest():
+    # oldest first: the run of seen entries does not start at the previous newest entry
+    parsed_feed = parse_feed(feed_document(["a", "b", "c", "d"]), ("c", frozenset("abc")))
+
+    assert parsed_links(parsed_feed) == ["a", "b", "c", "d"]
+    assert parsed_feed[3] is True
+
+
+def test_new_entries_first():
+    def entries(links):
+        return [{"link": link} for link in links]
+
+    assert new_entries_first(entries("xabc"), {"x"}) is True
+    assert new_entries_first(entries("abcx"), {"x"}) is False
+    assert new_entries_first(entries("abxc"), {"x"}) is False
+    assert new_entries_first(entries("abc"), {"a", "b", "c"}) is None
+    assert new_entries_first(entries("abc"), set()) is None
@@ -0,0 +1,40 @@
+import asyncio
+
+from youmu.modules import history
+from youmu.modules import migrations
+from youmu.modules.database import Database
+
+
+async def memory_database():
+    db = await Database.connect(":memory:")
+    for statements in migrations.migrations:
+        for statement in statements:
+            if not callable(statement):
+                await db.execute(statement)
+    return db
+
+
+def test_load_seen_sets_keeps_rows_recorded_while_loading():
+    async def run():
+        history.seen_sets.clear()
+        db = await memory_database()
+        try:
+            url = "https://osu.ppy.sh/feed"
+            await history.record_seen(db, "rssfeed_history", [[url, "old"]])
+
+            loader = asyncio.ensure_future(history.load_seen_sets(db))
+            await asyncio.sleep(0)
+            await history.record_seen(db, "rssfeed_history", [[url, "new"]])
+            await loader
+
+            seen_set = history.seen_sets["rssfeed_history"]
+            assert seen_set.lookup(url, "old")
+            assert seen_set.lookup(url, "new")
+            assert history.loading_keys == {}
+            assert await history.filter_unseen(db, "rssfeed_history", "entry_id", ["old", "new", "newer"],
+                                               "url", url) == ["newer"]
+        finally:
+            history.seen_sets.clear()
+            await db.close()
+
+    asyncio.run(run())
@@ -0,0 +1,119 @@
+import asyncio
+import random
+
+from youmu.modules import membership
+from youmu.modules import migrations
+from youmu.modules.database import Database
+
+large_roster_size = 150000
+
+
+def large_roster(seed, size=large_roster_size):
+    return random.Random(seed).sample(range(1, 40000000), size)
+
+
+def test_diff_large_rosters():
+    cached_ids = large_roster(1)
+    left = set(random.Random(2).sample(cached_ids, 2000))
+    joined = set(large_roster(3, 2000)) - set(cached_ids)
+    fresh_ids = [osu_id for osu_id in cached_ids if osu_id not in left] + list(joined)
+    random.Random(4).shuffle(fresh_ids)
+
+    added, removed = membership.diff(cached_ids, fresh_ids)
+
+    assert added == sorted(joined)
+    assert removed == sorted(left)
+
+
+def test_diff_compares_str_and_int_ids_as_ints():
+    cached_ids = large_roster(5)
+    # large_roster only picks IDs below 40000000
+    fresh_ids = [str(osu_id) for osu_id in cached_ids[1:]] + ["40000001"]
+
+    added, removed = membership.diff(cached_ids, fresh_ids)
+
+    assert added == [40000001]
+    assert removed == [cached_ids[0]]
+    assert all(type(osu_id) is int for osu_id in added + removed)
+
+
+def test_diff_identical_rosters():
+    cached_ids = large_roster(6)
+
+    assert membership.diff(cached_ids, list(reversed(cached_ids))) == ([], [])
+
+
+def test_diff_empty_rosters():
+    roster = large_roster(7)
+
+    assert membership.diff([], []) == ([], [])
+    assert membership.diff([], roster) == (sorted(roster), [])
+    assert membership.diff(roster, []) == ([], sorted(roster))
+
+
+def test_diff_fully_replaced_roster():
+    cached_ids = list(range(1, large_roster_size + 1))
+    fresh_ids = list(range(large_roster_size + 1, 2 * large_roster_size + 1))
+
+    added, removed = membership.diff(cached_ids, fresh_ids)
+
+    assert added == fresh_ids
+    assert removed == cached_ids
+
+
+def test_pack_round_trip():
+    roster = large_roster(8)
+
+    assert list(membership.unpack(membership.pack(roster))) == sorted(roster)
+
+
+async def memory_database():
+    db = await Database.connect(":memory:")
+    for statements in migrations.migrations:
+        for statement in statements:
+            # the Python steps move existing data, there is none in a new database
+            if not callable(statement):
+                await db.execute(statement)
+    return db
+
+
+async def read_group(db, group_id):
+    async with db.execute("SELECT member_ids, roster_hash, timestamp FROM groupfeed_roster_snapshots "
+                          "WHERE group_id = ?", [group_id]) as cursor:
+        snapshot = await cursor.fetchone()
+    async with db.execute("SELECT osu_id, added, timestamp FROM groupfeed_change_log "
+                          "WHERE group_id = ? ORDER BY added DESC, osu_id", [group_id]) as cursor:
+        change_log = await cursor.fetchall()
+    return snapshot, change_log
+
+
+def test_apply_writes_snapshot_and_change_log():
+    async def run():
+        db = await memory_database()
+        cached_ids = large_roster(9)
+        await membership.apply(db, 4, membership.pack(cached_ids), 1000)
+        await db.flush()
+
+        snapshot, change_log = await read_group(db, 4)
+        assert list(membership.unpack(snapshot[0])) == sorted(cached_ids)
+        assert snapshot[1] == membership.roster_hash(membership.pack(cached_ids))
+        assert snapshot[2] == 1000
+        assert change_log == []
+
+        fresh_ids = cached_ids[1000:] + [1, 2, 3]
+        packed = membership.pack(fresh_ids)
+        added, removed = membership.diff(membership.unpack(snapshot[0]), membership.unpack(packed))
+        await membership.apply(db, 4, packed, 2000, added, removed)
+        await db.flush()
+
+        snapshot, change_log = await read_group(db, 4)
+        assert list(membership.unpack(snapshot[0])) == sorted(set(fresh_ids))
+        assert snapshot[1] == membership.roster_hash(packed)
+        assert snapshot[2] == 2000
+        assert change_log == [(osu_id, 1, 2000) for osu_id in added] + \
+                             [(osu_id, 0, 2000) for osu_id in removed]
+        assert len(removed) == 1000
+
+        await db.close()
+
+    asyncio.run(run())
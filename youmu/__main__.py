@@ -1,31 +1,47 @@
 #!/usr/bin/env python3
 
+import time
+
+# taken before anything else is imported, so the import phase is timed too
+startup_started_at = time.perf_counter()
+
 from discord.ext import commands
-import aiosqlite
 import os
 
 from aioosuapi import aioosuapi
 from aioosuwebapi import aioosuwebapi
 
 from youmu.modules import first_run
+from youmu.modules import permissions
+from youmu.modules import connections
+from youmu.modules import http_client
+from youmu.modules import clock
+from youmu.modules import history
+from youmu.modules.dispatcher import PostDispatcher
+from youmu.modules.rate_limiter import RateLimiter
+from youmu.modules.cache import AsyncTTLCache
+from youmu.modules.routing import SubscriptionRouter
+from youmu.modules.database import Database
+from youmu.modules.feed_parsing import FeedParserPool
+from youmu.modules import settings
+from youmu.modules import metrics
+from youmu.modules.startup import StartupTimer
 from youmu.manifest import VERSION
 from youmu.manifest import CONTRIBUTORS
 
 from youmu.modules.storage_management import database_file as database_file
-from youmu.modules.connections import bot_token as bot_token
-from youmu.modules.connections import osu_api_key as osu_api_key
-from youmu.modules.connections import client_id as client_id
-from youmu.modules.connections import client_secret as client_secret
+
+startup_timer = StartupTimer(startup_started_at)
+startup_timer.phase("imports")
 
 if os.environ.get('YOUMU_PREFIX'):
     command_prefix = os.environ.get('YOUMU_PREFIX')
 else:
     command_prefix = "'"
 
-first_run.ensure_tables()
-
 initial_extensions = [
     "youmu.cogs.BotManagement",
+    "youmu.cogs.DatabaseMaintenance",
     "youmu.cogs.GroupFeed",
     "youmu.cogs.RankFeed",
     "youmu.cogs.RSSFeed",
@@ -37,23 +53,54 @@ class Youmu(commands.Bot):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.background_tasks = []
+        self.clock = clock.create_clock()
+        self.db = None
+        self.http_session = None
+        self.startup_timer = startup_timer
 
         self.app_version = VERSION
         self.project_contributors = CONTRIBUTORS
 
         self.description = f"Youmu {self.app_version}"
         self.database_file = database_file
-        self.osu = aioosuapi(osu_api_key)
-        self.osuweb = aioosuwebapi(client_id, client_secret)
+        self.osu = None
+        self.osuweb = None
+        # shared by every cog that calls the osu! web API
+        self.osuweb_limiter = RateLimiter(settings.osuweb_rate, settings.osuweb_per)
+        self.post_dispatcher = PostDispatcher()
+        self.feed_parser = FeedParserPool()
+        self.beatmapset_cache = AsyncTTLCache(settings.beatmapset_cache_size, settings.beatmapset_cache_ttl)
+        self.subscriptions = SubscriptionRouter()
+        self.metrics_runner = None
+        metrics.dispatch_queue_depth.set_function(self.post_dispatcher.queue_depth)
 
         for extension in initial_extensions:
             try:
                 self.load_extension(extension)
             except Exception as e:
                 print(e)
+        self.startup_timer.phase("extensions")
 
     async def start(self, *args, **kwargs):
-        self.db = await aiosqlite.connect(self.database_file)
+        # nothing here blocks the event loop, the migrations run in a worker thread
+        await first_run.ensure_tables(self.database_file)
+        self.db = await Database.connect(self.database_file)
+        self.startup_timer.phase("database")
+
+        await permissions.cache.load(self.db)
+        self.startup_timer.phase("permissions")
+
+        # the seen-sets are built after login, see on_ready
+        await self.subscriptions.load(self.db)
+        self.startup_timer.phase("subscriptions")
+
+        self.http_session = http_client.create_session()
+        self.osu = metrics.InstrumentedClient(aioosuapi(connections.osu_api_key()), "osu_v1")
+        self.osuweb = metrics.InstrumentedClient(aioosuwebapi(connections.client_id(), connections.client_secret()),
+                                                 "osu_v2")
+        if settings.metrics_port:
+            self.metrics_runner = await metrics.start_server(settings.metrics_host, settings.metrics_port)
+        self.startup_timer.phase("clients")
 
         await super().start(*args, **kwargs)
 
@@ -63,8 +110,23 @@ class Youmu(commands.Bot):
         for task in self.background_tasks:
             task.cancel()
 
+        # Stop sending queued feed posts
+        await self.post_dispatcher.close()
+
+        # Stop the feed parser workers
+        self.feed_parser.close()
+
         # Close osu web api session
-        await self.osuweb.close()
+        if self.osuweb:
+            await self.osuweb.close()
+
+        # Stop serving metrics
+        if self.metrics_runner:
+            await self.metrics_runner.cleanup()
+
+        # Close the shared HTTP session
+        if self.http_session:
+            await self.http_session.close()
 
         # Close connection to the database
         if self.db:
@@ -76,13 +138,28 @@ class Youmu(commands.Bot):
         # for now let's just quit() since the thing above does not work :c
         quit()
 
+    async def load_seen_sets(self):
+        started_at = time.perf_counter()
+        await history.load_seen_sets(self.db)
+        seconds = time.perf_counter() - started_at
+        metrics.startup_phase_seconds.set(seconds, "seen_sets")
+        print(f"Seen-sets loaded in {seconds * 1000:.1f} ms")
+
     async def on_ready(self):
         print("Logged in as")
         print(self.user.name)
         print(self.user.id)
         print("------")
+
+        # on_ready also fires after a reconnect, only the first one ends the startup
+        if self.startup_timer:
+            self.startup_timer.phase("login")
+            print(self.startup_timer.report())
+            self.startup_timer = None
+            self.background_tasks.append(self.loop.create_task(self.load_seen_sets()))
+
         await first_run.add_admins(self)
 
 
 client = Youmu(command_prefix=command_prefix)
-client.run(bot_token)
+client.run(connections.bot_token())
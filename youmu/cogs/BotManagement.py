@@ -1,7 +1,6 @@
 import discord
 import os
 import time
-import psutil
 from discord.ext import commands
 from youmu.modules import permissions
 from youmu.reusables import send_large_message
@@ -26,7 +25,7 @@ class BotManagement(commands.Cog):
         """
 
         buffer = ""
-        for user_id in permissions.admin_list:
+        for user_id in sorted(permissions.cache.admins):
             buffer += f"<@{user_id}>\n"
 
         embed = discord.Embed(title="Bot admin list", color=0xf76a8c)
@@ -39,7 +38,6 @@ class BotManagement(commands.Cog):
     async def make_admin(self, ctx, user_id: str, perms=0):
         """
         Adds a user to a list of users the bot will treat as admins.
-        This will apply after a restart.
 
         user_id: This must be an ID of a discord account.
         perms: This must be either 0 or 1. 1 gives owner perms. 0 gives admin perms.
@@ -50,7 +48,8 @@ class BotManagement(commands.Cog):
             return
 
         await self.bot.db.execute("INSERT INTO admins VALUES (?, ?)", [int(user_id), int(perms)])
-        await self.bot.db.commit()
+        await self.bot.db.flush()
+        permissions.cache.add_admin(int(user_id), owner=int(perms) == 1)
 
         await ctx.send(":ok_hand:")
 
@@ -94,7 +93,6 @@ class BotManagement(commands.Cog):
     async def ignore_user(self, ctx, user_id: str, *, reason="No reason provided"):
         """
         Add a user to a list of users the bot will ignore commands from.
-        This will apply after a restart.
 
         user_id: This must be an ID of a discord account.
         reason: Optional parameter, meant to be a reason why the user was blacklisted.
@@ -105,7 +103,21 @@ class BotManagement(commands.Cog):
             return
 
         await self.bot.db.execute("INSERT INTO ignored_users VALUES (?, ?)", [int(user_id), str(reason)])
-        await self.bot.db.commit()
+        await self.bot.db.flush()
+        permissions.cache.ignore(int(user_id))
+
+        await ctx.send(":ok_hand:")
+
+    @commands.command(name="reload_permissions", brief="Reload admins and ignored users from the database")
+    @commands.check(permissions.is_owner)
+    @commands.check(permissions.is_not_ignored)
+    async def reload_permissions(self, ctx):
+        """
+        Reload the bot admin list and the ignore list from the database.
+        Only needed after they were edited outside of the bot's commands.
+        """
+
+        await permissions.cache.load(self.bot.db)
 
         await ctx.send(":ok_hand:")
 
@@ -133,10 +145,15 @@ class BotManagement(commands.Cog):
         """
 
         try:
+            await self.bot.db.flush()
             async with await self.bot.db.execute(query) as cursor:
                 response = await cursor.fetchall()
 
-            await self.bot.db.commit()
+            await self.bot.db.flush()
+
+            # the query may have changed subscriptions or permissions behind the caches' backs
+            await self.bot.subscriptions.load(self.bot.db)
+            await permissions.cache.load(self.bot.db)
 
             if not response:
                 embed = discord.Embed(description="query executed successfully", color=0xadff2f)
@@ -219,6 +236,8 @@ class BotManagement(commands.Cog):
             await ctx.send("This channel is not approved for dumping the database.")
             return
 
+        # WAL mode keeps recent writes next to the main file until they are checkpointed
+        await self.bot.db.checkpoint()
         await ctx.send(file=discord.File(database_file))
 
     @commands.command(name="about", brief="About this bot", aliases=['bot', 'info'])
@@ -228,6 +247,8 @@ class BotManagement(commands.Cog):
         Shows various information about this bot and the instance of it.
         """
 
+        import psutil
+
         app_info = await self.bot.application_info()
 
         process = psutil.Process(os.getpid())
@@ -259,6 +280,7 @@ class BotManagement(commands.Cog):
 
         buffer += f"**Uptime:** {uptime}\n"
         buffer += f"**Memory usage:** {memory_usage} MB\n"
+        buffer += f"**Feed posts queued:** {self.bot.post_dispatcher.queue_depth()}\n"
         buffer += f"\n"
 
         buffer += f"**Bot contributors:**\n"
@@ -0,0 +1,96 @@
+import time
+import discord
+from discord.ext import commands
+
+from youmu.modules import permissions
+from youmu.modules import retention
+from youmu.modules import settings
+from youmu.modules import metrics
+from youmu.modules.retention import database_bytes
+
+
+class DatabaseMaintenance(commands.Cog):
+    """
+    Keeps the *_history tables from growing without bound.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.bot.background_tasks.append(
+            self.bot.loop.create_task(self.retention_background_loop())
+        )
+
+    @commands.command(name="db_prune", brief="Prune old feed history now")
+    @commands.check(permissions.is_admin)
+    @commands.check(permissions.is_not_ignored)
+    async def db_prune(self, ctx):
+        """
+        Remove feed history that can no longer be needed for deduplication,
+        then report how many rows and bytes were reclaimed.
+        """
+
+        report = await retention.run(self.bot.db)
+
+        buffer = ""
+        for table, pruned_rows in report.pruned_rows.items():
+            buffer += f"**{table}:** {pruned_rows} rows pruned\n"
+        buffer += "\n"
+        buffer += f"**Space reclaimed:** {self.format_bytes(report.reclaimed_bytes)}\n"
+        buffer += f"**File size:** {self.format_bytes(report.file_bytes_before)} -> " \
+                  f"{self.format_bytes(report.file_bytes_after)}\n"
+        buffer += f"**Free space inside the file:** {self.format_bytes(report.free_bytes)}\n"
+        buffer += f"**Took:** {report.duration:.2f}s\n"
+
+        embed = discord.Embed(title="Database pruned", description=buffer, color=0xadff2f)
+        await ctx.send(embed=embed)
+
+    @commands.command(name="db_vacuum", brief="Rebuild the database file")
+    @commands.check(permissions.is_owner)
+    @commands.check(permissions.is_not_ignored)
+    async def db_vacuum(self, ctx):
+        """
+        Rebuild the database file, which returns all free space to the OS.
+        This also switches the database to incremental auto vacuum, so later prunes shrink the file on their own.
+        The bot does not process anything else while this runs.
+        """
+
+        file_bytes_before, _ = await database_bytes(self.bot.db)
+
+        await self.bot.db.checkpoint()
+        await self.bot.db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        await self.bot.db.execute("VACUUM")
+
+        file_bytes_after, _ = await database_bytes(self.bot.db)
+
+        await ctx.send(f"Database vacuumed: {self.format_bytes(file_bytes_before)} -> "
+                       f"{self.format_bytes(file_bytes_after)}")
+
+    async def retention_background_loop(self):
+        print("Retention Loop launched!")
+        await self.bot.wait_until_ready()
+        while not self.bot.is_closed():
+            try:
+                await self.bot.clock.sleep(600)
+
+                report = await retention.run(self.bot.db, self.bot.clock.time())
+                metrics.loop_pass_seconds.observe(report.duration, "retention")
+                print(time.strftime("%X %x %Z") + f" | pruned {report.total_pruned_rows} history rows, "
+                                                  f"reclaimed {self.format_bytes(report.reclaimed_bytes)} "
+                                                  f"in {report.duration:.2f}s")
+                await self.bot.clock.sleep(settings.history_retention_interval)
+            except Exception as e:
+                print(time.strftime("%X %x %Z"))
+                print("in retention_background_loop")
+                print(e)
+                await self.bot.clock.sleep(settings.history_retention_interval)
+
+    def format_bytes(self, size):
+        for unit in ["B", "KB", "MB"]:
+            if abs(size) < 1024:
+                return f"{size:.1f} {unit}"
+            size /= 1024
+        return f"{size:.1f} GB"
+
+
+def setup(bot):
+    bot.add_cog(DatabaseMaintenance(bot))
@@ -4,8 +4,9 @@ import discord
 from discord.ext import commands
 from discord.utils import escape_markdown
 from youmu.modules import permissions
+from youmu.modules import membership
+from youmu.modules import metrics
 from youmu.reusables import send_large_message
-from youmu.reusables import list_helpers
 from youmu.embeds import GroupFeed as GroupFeedEmbeds
 
 
@@ -24,6 +25,7 @@ class FakeUser:
 class GroupFeed(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.member_info = membership.MemberInfoCache()
         self.group_list = (
             (7, "Nomination Assessment Team"),
             (28, "Beatmap Nominators"),
@@ -42,7 +44,8 @@ class GroupFeed(commands.Cog):
     @commands.check(permissions.is_not_ignored)
     async def groupfeed_add(self, ctx):
         await self.bot.db.execute("INSERT INTO groupfeed_channel_list VALUES (?)", [int(ctx.channel.id)])
-        await self.bot.db.commit()
+        await self.bot.db.flush()
+        self.bot.subscriptions.add("groupfeed", None, ctx.channel.id)
         await ctx.send(":ok_hand:")
 
     @commands.command(name="groupfeed_remove", brief="Remove a groupfeed from the current channel")
@@ -50,7 +53,8 @@ class GroupFeed(commands.Cog):
     @commands.check(permissions.is_not_ignored)
     async def groupfeed_remove(self, ctx):
         await self.bot.db.execute("DELETE FROM groupfeed_channel_list WHERE channel_id = ?", [int(ctx.channel.id)])
-        await self.bot.db.commit()
+        await self.bot.db.flush()
+        self.bot.subscriptions.remove("groupfeed", None, ctx.channel.id)
         await ctx.send(":ok_hand:")
 
     @commands.command(name="groupfeed_channel_list", brief="Print GroupFeed enabled channels")
@@ -74,36 +78,82 @@ class GroupFeed(commands.Cog):
         embed = discord.Embed(color=0xff6781)
         await send_large_message.send_large_embed(ctx.channel, embed, buffer)
 
+    @commands.command(name="groupfeed_changes", brief="Show who joined or left a group recently")
+    @commands.check(permissions.is_admin)
+    @commands.check(permissions.is_not_ignored)
+    async def groupfeed_changes(self, ctx, group_id: int, days: int = 30):
+        """
+        Show who joined or left a group in the last few days, 30 by default.
+        """
+
+        async with await self.bot.db.execute("SELECT osu_id, added, timestamp FROM groupfeed_change_log "
+                                             "WHERE group_id = ? AND timestamp >= ? ORDER BY timestamp",
+                                             [int(group_id), int(self.bot.clock.time()) - days * 86400]) as cursor:
+            change_log = await cursor.fetchall()
+        if not change_log:
+            await ctx.send(f"No changes in {self.get_group_name(group_id)} in the last {days} days")
+            return
+
+        await self.member_info.load(self.bot.db)
+
+        buffer = f":notepad_spiral: **{self.get_group_name(group_id)}, last {days} days**\n\n"
+        for osu_id, added, timestamp in change_log:
+            cached_info = self.member_info.get(osu_id)
+            username = escape_markdown(cached_info[1]) if cached_info else str(osu_id)
+            action = "joined" if added else "left"
+            buffer += f"{time.strftime('%Y-%m-%d', time.gmtime(timestamp))} | " \
+                      f"[{username}](https://osu.ppy.sh/users/{osu_id}) {action}\n"
+
+        embed = discord.Embed(color=0xff6781)
+        await send_large_message.send_large_embed(ctx.channel, embed, buffer)
+
     async def groupfeed_background_loop(self):
         await self.bot.wait_until_ready()
         while not self.bot.is_closed():
-            await asyncio.sleep(10)
+            await self.bot.clock.sleep(10)
 
-            async with await self.bot.db.execute("SELECT channel_id FROM groupfeed_channel_list") as cursor:
-                channel_list = await cursor.fetchall()
+            channel_list = self.bot.subscriptions.channels("groupfeed")
             if not channel_list:
-                await asyncio.sleep(1600)
+                await self.bot.clock.sleep(1600)
                 continue
 
             print(time.strftime("%X %x %Z") + " | performing groupfeed check")
 
-            channel_list = list_helpers.unnest_list(channel_list)
-
-            for group_id, group_name in self.group_list:
-                await self.check_group(channel_list, group_id)
-                await asyncio.sleep(120)
+            with metrics.loop_pass_seconds.time("groupfeed"):
+                await self.check_groups(channel_list)
 
             print(time.strftime("%X %x %Z") + " | finished groupfeed check")
 
-            await asyncio.sleep(1600)
+            await self.bot.clock.sleep(1600)
+
+    async def check_groups(self, channel_list):
+        """
+        One pass: check every group at the same time.
+        A failing group is logged and does not stop the others.
+        """
+
+        results = await asyncio.gather(*[
+            self.check_group(channel_list, group_id) for group_id, group_name in self.group_list
+        ], return_exceptions=True)
+        for (group_id, group_name), result in zip(self.group_list, results):
+            if isinstance(result, Exception):
+                print(time.strftime("%X %x %Z"))
+                print(f"in groupfeed.check_groups for {group_name}")
+                print(result)
 
     async def check_group(self, channel_list, group_id):
-        fresh_entries = await self.bot.osuweb.scrape_group_members_array(group_id)
+        """
+        Scrape one group and post its membership changes. All groups are checked at the same time,
+        the shared osu! web rate limiter does the pacing.
+        """
+
+        async with self.bot.osuweb_limiter:
+            fresh_entries = await self.bot.osuweb.scrape_group_members_array(group_id)
         if not fresh_entries:
             print("groupfeed connection problems?")
             return
 
-        await self.populate_member_info(fresh_entries)
+        await self.member_info.update(self.bot.db, fresh_entries)
 
         events = await self.get_changes(fresh_entries, group_id)
 
@@ -111,64 +161,28 @@ class GroupFeed(commands.Cog):
             for event in events:
                 await self.execute_event(channel_list, event, group_id)
 
-    async def populate_member_info(self, fresh_entries):
-        async with await self.bot.db.execute("SELECT osu_id FROM groupfeed_member_info") as cursor:
-            cached_info = await cursor.fetchall()
-        cached_info = list_helpers.unnest_list(cached_info)
-
-        for fresh_member in fresh_entries:
-            if not str(fresh_member["id"]) in cached_info:
-                try:
-                    country_code = fresh_member["country"]["code"]
-                except:
-                    # thanks notbakaneko
-                    country_code = "white"  # :flag_white: is a placeholder flag
-                await self.bot.db.execute("INSERT INTO groupfeed_member_info VALUES (?, ?, ?)",
-                                          [int(fresh_member["id"]), str(fresh_member["username"]),
-                                           str(country_code)])
-        await self.bot.db.commit()
-
     async def get_changes(self, fresh_entries, group_id):
-        async with await self.bot.db.execute("SELECT osu_id FROM groupfeed_group_members WHERE group_id = ?",
-                                             [int(group_id)]) as cursor:
-            cached_entries = await cursor.fetchall()
-        if not cached_entries:
-            # if we are here, it means this group has no members, which means it was recently tracked. 
-            # therefore, we'll just put all users inside the db and return empty list
+        packed = membership.pack(self.unnest_group_member_id(fresh_entries))
+
+        async with await self.bot.db.execute("SELECT member_ids, roster_hash FROM groupfeed_roster_snapshots "
+                                             "WHERE group_id = ?", [int(group_id)]) as cursor:
+            snapshot = await cursor.fetchone()
+        if not snapshot:
+            # if we are here, it means this group has no snapshot, which means it was recently tracked.
+            # therefore, we'll just store the roster and return empty list
             print(f"populating the db for group {group_id}")
 
-            for one_member in fresh_entries:
-                await self.bot.db.execute("INSERT INTO groupfeed_group_members VALUES (?, ?)",
-                                          [int(one_member["id"]), int(group_id)])
-            await self.bot.db.commit()
+            await membership.apply(self.bot.db, group_id, packed, self.bot.clock.time())
             return []
 
-        changes = []
-
-        fresh_entries = self.unnest_group_member_id(fresh_entries)
-
-        # this piece of code checks if there are new members that are not in local db
-        cached_entries = list_helpers.unnest_list(cached_entries)
-
-        for fresh_member in fresh_entries:
-            if not int(fresh_member) in cached_entries:
-                await self.bot.db.execute("INSERT INTO groupfeed_group_members VALUES (?, ?)",
-                                          [int(fresh_member), int(group_id)])
-                changes.append([True, int(fresh_member)])
-
-        await self.bot.db.commit()
-        await asyncio.sleep(5)
-
-        # this piece of code checks if there are members in db but not online
-        for cached_member in cached_entries:
-            if not str(cached_member) in fresh_entries:
-                await self.bot.db.execute("DELETE FROM groupfeed_group_members WHERE osu_id = ? AND group_id = ?",
-                                          [int(cached_member), int(group_id)])
-                changes.append([False, str(cached_member)])
+        cached_member_ids, cached_roster_hash = snapshot
+        if cached_roster_hash == membership.roster_hash(packed):
+            return []
 
-        await self.bot.db.commit()
+        added, removed = membership.diff(membership.unpack(cached_member_ids), membership.unpack(packed))
+        await membership.apply(self.bot.db, group_id, packed, self.bot.clock.time(), added, removed)
 
-        return changes
+        return [[True, osu_id] for osu_id in added] + [[False, osu_id] for osu_id in removed]
 
     async def execute_event(self, channel_list, event, group_id):
         group_name = self.get_group_name(group_id)
@@ -186,10 +200,7 @@ class GroupFeed(commands.Cog):
 
         if not user:
             # user is restricted
-            async with await self.bot.db.execute("SELECT osu_id, username, country FROM groupfeed_member_info "
-                                                 "WHERE osu_id = ?",
-                                                 [int(event[1])]) as cursor:
-                cached_info = await cursor.fetchone()
+            cached_info = self.member_info.get(event[1])
             if not cached_info:
                 cached_info = (str(event[1]), "someone???", "white")
             user = FakeUser(cached_info)
@@ -209,10 +220,12 @@ class GroupFeed(commands.Cog):
         description = description_template % (flag_sign, what_user, what_group)
 
         embed = await GroupFeedEmbeds.group_member(thumbnail_url, description, color)
+        sent_messages = []
         for channel_id in channel_list:
             channel = self.bot.get_channel(int(channel_id))
             if channel:
-                await channel.send(embed=embed)
+                sent_messages.append(self.bot.post_dispatcher.send(channel, embed=embed))
+        await asyncio.gather(*sent_messages)
 
     def unnest_group_member_id(self, group_members):
         buffer = []
@@ -1,19 +1,51 @@
-import feedparser
-import aiohttp
 import time
 import asyncio
 import discord
 from discord.ext import commands
 import re
 from html import unescape
+from urllib.parse import urlparse
 
 from youmu.modules import permissions
+from youmu.modules import history
+from youmu.modules import settings
+from youmu.modules import feed_scheduler
+from youmu.modules import metrics
+from youmu.modules.feed_parsing import feed_head_size
+from youmu.modules.feed_parsing import new_entries_first
 from youmu.reusables import send_large_message
+from youmu.reusables import list_helpers
+
+
+class FeedDownload:
+    def __init__(self, status, contents=None, etag=None, last_modified=None, cache_control=None, size=0):
+        self.status = status
+        self.contents = contents
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.cache_control = cache_control
+
+    @property
+    def not_modified(self):
+        return self.status == 304
 
 
 class RSSFeed(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.poll_workers = asyncio.Semaphore(settings.rss_poll_workers)
+        self.host_workers = {}
+        # url: (newest ID, IDs of the newest entries) known to be posted, lets the parser stop early
+        self.feed_heads = {}
+        # feeds seen to list new entries above old ones, only these get a feed head
+        self.new_entries_first = set()
+        # url: parses in a row that stopped early
+        self.early_stops = {}
+        self.scheduler = feed_scheduler.FeedScheduler(settings.rss_min_poll_interval,
+                                                      settings.rss_max_poll_interval,
+                                                      settings.rss_default_poll_interval,
+                                                      clock=self.bot.clock)
         self.bot.background_tasks.append(
             self.bot.loop.create_task(self.rssfeed_background_loop())
         )
@@ -26,10 +58,13 @@ class RSSFeed(commands.Cog):
         Subscribe to an RSS feed in the current channel.
         """
 
-        url_raw_contents = await self.fetch(url)
-        url_parsed_contents = feedparser.parse(url_raw_contents)
-        feed_entries = url_parsed_contents["entries"]
-        if not feed_entries:
+        download = await self.fetch(url)
+        if not download:
+            await ctx.send("can't check to this url")
+            return
+
+        parsed_feed = await self.bot.feed_parser.parse(download.contents)
+        if not parsed_feed or not parsed_feed[0]:
             await ctx.send("can't check to this url")
             return
 
@@ -38,15 +73,13 @@ class RSSFeed(commands.Cog):
         if not check_is_already_tracked:
             await self.bot.db.execute("INSERT INTO rssfeed_tracklist VALUES (?)", [str(url)])
 
-        for entry_metadata in feed_entries:
-            entry_id = entry_metadata["link"]
-            async with await self.bot.db.execute("SELECT entry_id FROM rssfeed_history WHERE url = ? AND entry_id = ?",
-                                                 [str(url), str(entry_id)]) as cursor:
-                check_is_entry_in_history = await cursor.fetchone()
-            if not check_is_entry_in_history:
-                await self.bot.db.execute("INSERT INTO rssfeed_history VALUES (?, ?)", [str(url), str(entry_id)])
+        entry_ids = [str(entry_metadata["link"]) for entry_metadata in parsed_feed[0]]
+        new_entry_ids = await history.filter_unseen(self.bot.db, "rssfeed_history", "entry_id", entry_ids,
+                                                    "url", str(url))
+        await history.record_seen(self.bot.db, "rssfeed_history",
+                                  [(str(url), entry_id) for entry_id in new_entry_ids])
 
-        await self.bot.db.commit()
+        await self.bot.db.flush()
 
         async with await self.bot.db.execute("SELECT channel_id FROM rssfeed_channels WHERE channel_id = ? AND url = ?",
                                              [int(ctx.channel.id), str(url)]) as cursor:
@@ -56,8 +89,9 @@ class RSSFeed(commands.Cog):
             return
 
         await self.bot.db.execute("INSERT INTO rssfeed_channels VALUES (?, ?)", [str(url), int(ctx.channel.id)])
+        await self.bot.db.flush()
+        self.bot.subscriptions.add("rss", str(url), ctx.channel.id)
         await ctx.send(f"Feed `{url}` is now tracked in this channel")
-        await self.bot.db.commit()
 
     @commands.command(name="rss_remove", brief="Unsubscribe to an RSS feed in the current channel")
     @commands.check(permissions.is_admin)
@@ -69,7 +103,8 @@ class RSSFeed(commands.Cog):
 
         await self.bot.db.execute("DELETE FROM rssfeed_channels WHERE url = ? AND channel_id = ? ",
                                   [str(url), int(ctx.channel.id)])
-        await self.bot.db.commit()
+        await self.bot.db.flush()
+        self.bot.subscriptions.remove("rss", str(url), ctx.channel.id)
 
         await ctx.send(f"Feed `{url}` is no longer tracked in this channel")
 
@@ -81,7 +116,9 @@ class RSSFeed(commands.Cog):
         Show a list of all RSS feeds being tracked
         """
 
-        async with await self.bot.db.execute("SELECT url FROM rssfeed_tracklist") as cursor:
+        async with await self.bot.db.execute("SELECT rssfeed_tracklist.url, rssfeed_fetch_state.last_bytes "
+                                             "FROM rssfeed_tracklist LEFT JOIN rssfeed_fetch_state "
+                                             "ON rssfeed_tracklist.url = rssfeed_fetch_state.url") as cursor:
             tracklist = await cursor.fetchall()
         if not tracklist:
             await ctx.send("RSS tracklist is empty")
@@ -96,7 +133,8 @@ class RSSFeed(commands.Cog):
             for destination_id in destination_list:
                 destination_list_str += f"<#{destination_id[0]}> "
             if (str(ctx.channel.id) in destination_list_str) or everywhere:
-                buffer += f"url: `{one_entry[0]}` | channels: {destination_list_str}\n"
+                buffer += f"url: `{one_entry[0]}` | size: {(one_entry[1] or 0) / 1024:.1f} KB | " \
+                          f"channels: {destination_list_str}\n"
         embed = discord.Embed(color=0xff6781)
         await send_large_message.send_large_embed(ctx.channel, embed, buffer)
 
@@ -119,98 +157,272 @@ class RSSFeed(commands.Cog):
         else:
             return None
 
-    async def fetch(self, url):
+    async def fetch(self, url, etag=None, last_modified=None):
+        """
+        Download a feed. If validators from a previous download are passed,
+        the request is made conditional and the server may answer with 304 Not Modified.
+        The body is read in chunks and the download is dropped as soon as it is larger than
+        rss_max_download_bytes, or right away if the Content-Type is not one of rss_content_types.
+        Returns a FeedDownload, or None if the feed could not be downloaded.
+        """
+
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        started_at = time.monotonic()
         try:
-            headers = {"Connection": "Upgrade", "Upgrade": "http/1.1"}
-            async with aiohttp.ClientSession(headers=headers) as session:
-                async with session.get(url) as response:
-                    http_contents = await response.text()
-                    if len(http_contents) > 4:
-                        return http_contents
-                    else:
+            async with self.bot.http_session.get(url, headers=headers) as response:
+                if response.status == 304:
+                    return FeedDownload(304, etag=etag, last_modified=last_modified,
+                                        cache_control=response.headers.get("Cache-Control"))
+
+                content_type = response.headers.get("Content-Type", "").lower()
+                if content_type and not any(allowed in content_type for allowed in settings.rss_content_types):
+                    print(f"RSSFeed {url} is {content_type}, not a feed")
+                    return None
+
+                if (response.content_length or 0) > settings.rss_max_download_bytes:
+                    print(f"RSSFeed {url} is {response.content_length} bytes, that is too large")
+                    return None
+
+                body = bytearray()
+                async for chunk in response.content.iter_chunked(settings.rss_download_chunk_size):
+                    body += chunk
+                    if len(body) > settings.rss_max_download_bytes:
+                        print(f"RSSFeed {url} is over {settings.rss_max_download_bytes} bytes, that is too large")
                         return None
+
+                # without a charset in the header, the parsers read the encoding from the XML declaration
+                http_contents = bytes(body)
+                if response.charset:
+                    try:
+                        http_contents = body.decode(response.charset, errors="replace")
+                    except LookupError:
+                        pass
+                if len(http_contents) > 4:
+                    return FeedDownload(response.status, http_contents,
+                                        response.headers.get("ETag"), response.headers.get("Last-Modified"),
+                                        response.headers.get("Cache-Control"), len(body))
+                else:
+                    return None
         except Exception as e:
             print(time.strftime("%X %x %Z"))
-            print("in rankfeed.fetch")
+            print("in rssfeed.fetch")
             print(e)
+            metrics.upstream_errors.inc("rss", "fetch")
             return None
+        finally:
+            metrics.upstream_request_seconds.observe(time.monotonic() - started_at, "rss", "fetch")
 
     async def rssfeed_background_loop(self):
         print("RSSFeed Loop launched!")
         await self.bot.wait_until_ready()
+
+        async with await self.bot.db.execute("SELECT url, poll_interval FROM rssfeed_fetch_state") as cursor:
+            poll_intervals = await cursor.fetchall()
+        for url, poll_interval in poll_intervals:
+            self.scheduler.load_interval(url, poll_interval)
+
         while not self.bot.is_closed():
             try:
-                await asyncio.sleep(10)
+                await self.bot.clock.sleep(10)
 
                 async with await self.bot.db.execute("SELECT url FROM rssfeed_tracklist") as cursor:
                     rssfeed_entries = await cursor.fetchall()
                 if not rssfeed_entries:
                     # RSS tracklist is empty
-                    await asyncio.sleep(1600)
+                    await self.bot.clock.sleep(1600)
                     continue
 
-                for rssfeed_entry in rssfeed_entries:
-                    url = rssfeed_entry[0]
-                    async with await self.bot.db.execute("SELECT channel_id FROM rssfeed_channels WHERE url = ?",
-                                                         [str(url)]) as cursor:
-                        channel_list = await cursor.fetchall()
-                    if not channel_list:
-                        await self.bot.db.execute("DELETE FROM rssfeed_tracklist WHERE url = ?", [str(url)])
-                        await self.bot.db.commit()
-                        print(f"{url} is not tracked in any channel so I am untracking it")
-                        continue
-
-                    print(f"checking {url}")
+                self.scheduler.sync(list_helpers.unnest_list(rssfeed_entries))
+                due_urls = self.scheduler.pop_due()
+                if due_urls:
+                    print(time.strftime("%X %x %Z") + f" | performing rss check of {len(due_urls)} feed(s)")
+                    with metrics.loop_pass_seconds.time("rssfeed"):
+                        await self.check_feeds(due_urls)
+                    print(time.strftime("%X %x %Z") + " | finished rss check")
+
+                # wake up at least every rss_scheduler_tick seconds to pick up newly added feeds
+                next_due = self.scheduler.seconds_until_next_due()
+                if next_due is None:
+                    next_due = settings.rss_scheduler_tick
+                await self.bot.clock.sleep(min(next_due, settings.rss_scheduler_tick))
+            except Exception as e:
+                print(time.strftime("%X %x %Z"))
+                print("in rssfeed_background_loop")
+                print(e)
+                await self.bot.clock.sleep(1200)
 
-                    url_raw_contents = await self.fetch(url)
+    async def check_feeds(self, urls):
+        """
+        Fetch and parse all feeds concurrently, then post the new entries of each feed.
+        A pass takes about as long as the slowest feed, not the sum of all of them.
+        Every polled feed is put back on the schedule afterwards.
+        """
 
-                    url_parsed_contents = feedparser.parse(url_raw_contents)
+        async with await self.bot.db.execute("SELECT url, etag, last_modified, poll_interval, entry_count, "
+                                             "last_bytes, total_bytes FROM rssfeed_fetch_state") as cursor:
+            fetch_state = await cursor.fetchall()
+        fetch_state = {row[0]: tuple(row[1:]) for row in fetch_state}
+
+        subscribed_feeds = {}
+        for url in urls:
+            channel_list = self.bot.subscriptions.channels("rss", str(url))
+            if not channel_list:
+                await self.bot.db.write("DELETE FROM rssfeed_tracklist WHERE url = ?", [str(url)])
+                await self.bot.db.write("DELETE FROM rssfeed_fetch_state WHERE url = ?", [str(url)])
+                self.scheduler.discard(url)
+                self.feed_heads.pop(url, None)
+                self.new_entries_first.discard(url)
+                self.early_stops.pop(url, None)
+                print(f"{url} is not tracked in any channel so I am untracking it")
+                continue
+            subscribed_feeds[url] = channel_list
+
+        polled_feeds = await asyncio.gather(*[
+            self.poll_feed(url, *fetch_state.get(url, (None, None))[:2]) for url in subscribed_feeds
+        ])
+
+        for url, polled_feed in zip(subscribed_feeds, polled_feeds):
+            etag, last_modified, poll_interval, entry_count, last_bytes, total_bytes = \
+                fetch_state.get(url, (None, None, None, None, None, None))
+
+            if not polled_feed:
+                self.scheduler.reschedule(url, new_entries=0)
+            else:
+                download, online_entries, ttl, skip_hours, complete = polled_feed
+                new_entries = 0
+                if not download.not_modified:
+                    last_bytes = download.size
+                    total_bytes = (total_bytes or 0) + download.size
+                    new_entry_ids = await self.post_new_entries(url, subscribed_feeds[url], online_entries)
+                    new_entries = len(new_entry_ids)
+                    if complete:
+                        self.early_stops.pop(url, None)
+                        self.learn_entry_order(url, online_entries, new_entry_ids)
+                    else:
+                        self.early_stops[url] = self.early_stops.get(url, 0) + 1
+                    if url in self.new_entries_first and online_entries:
+                        self.feed_heads[url] = (str(online_entries[0]["link"]),
+                                                frozenset(str(one_entry["link"])
+                                                          for one_entry in online_entries[:feed_head_size]))
+                    else:
+                        self.feed_heads.pop(url, None)
+
+                    # Validators are only stored once the entries are posted,
+                    # so a failed pass does not turn into a 304 that hides them.
+                    etag, last_modified = download.etag, download.last_modified
+                    # a parse that stopped early does not know how long the feed is
+                    if complete:
+                        entry_count = len(online_entries)
+
+                self.scheduler.reschedule(url, new_entries, ttl=ttl, skip_hours=skip_hours,
+                                          max_age=feed_scheduler.parse_max_age(download.cache_control))
+
+            new_state = (etag, last_modified, int(self.scheduler.get_interval(url)), entry_count,
+                         last_bytes, total_bytes)
+            if new_state != fetch_state.get(url):
+                await self.bot.db.write("INSERT INTO rssfeed_fetch_state VALUES (?, ?, ?, ?, ?, ?, ?) "
+                                        "ON CONFLICT(url) DO UPDATE SET "
+                                        "etag = excluded.etag, last_modified = excluded.last_modified, "
+                                        "poll_interval = excluded.poll_interval, entry_count = excluded.entry_count, "
+                                        "last_bytes = excluded.last_bytes, total_bytes = excluded.total_bytes",
+                                        [str(url), *new_state])
+
+    async def poll_feed(self, url, etag=None, last_modified=None):
+        """
+        Fetch one feed, bounded by the global and the per-host worker limits, and parse it in the parser pool.
+        Returns a (FeedDownload, entries, ttl, skip_hours, complete) tuple, or None if the feed could not be polled.
+        On feeds known to list new entries first, the parser may stop at the entries that were posted last time,
+        then entries is only the top of the feed and complete is False.
+        Feeds that have not been modified are not parsed and come back with no entries and no hints.
+        """
 
-                    if not url_parsed_contents:
+        async with self.poll_workers:
+            async with self.get_host_workers(url):
+                try:
+                    download = await self.fetch(url, etag, last_modified)
+                    if not download:
                         print(f"RSSFeed connection issues with {url} ???")
-                        await asyncio.sleep(10)
-                        continue
-
-                    online_entries = url_parsed_contents["entries"]
-
-                    for one_entry in online_entries:
-                        entry_id = one_entry["link"]
-                        async with await self.bot.db.execute("SELECT entry_id FROM rssfeed_history "
-                                                             "WHERE url = ? AND entry_id = ?",
-                                                             [str(url), str(entry_id)]) as cursor:
-                            check_is_already_in_history = await cursor.fetchone()
-                        if check_is_already_in_history:
-                            continue
-
-                        embed = await self.rss_entry_embed(one_entry)
-                        if not embed:
-                            print("RSSFeed embed returned nothing. this should not happen")
-                            continue
-
-                        for one_channel in channel_list:
-                            channel = self.bot.get_channel(int(one_channel[0]))
-                            if not channel:
-                                await self.bot.db.execute("DELETE FROM rssfeed_channels WHERE channel_id = ?",
-                                                          [int(one_channel[0])])
-                                await self.bot.db.commit()
-                                print(f"channel with id {one_channel[0]} no longer exists "
-                                      "so I am removing it from the list")
-                                continue
-
-                            await channel.send(embed=embed)
-
-                        await self.bot.db.execute("INSERT INTO rssfeed_history VALUES (?, ?)",
-                                                  [str(url), str(entry_id)])
-                        await self.bot.db.commit()
+                        return None
 
-                print(time.strftime("%X %x %Z"))
-                print("finished rss check")
-                await asyncio.sleep(1200)
-            except Exception as e:
-                print(time.strftime("%X %x %Z"))
-                print("in rssfeed_background_loop")
-                print(e)
-                await asyncio.sleep(1200)
+                    if download.not_modified:
+                        return download, [], None, None, True
+
+                    # now and then read the whole feed anyway, in case it changed how it orders its entries
+                    feed_head = self.feed_heads.get(url)
+                    if self.early_stops.get(url, 0) >= settings.rss_full_parse_every:
+                        feed_head = None
+                    parsed_feed = await self.bot.feed_parser.parse(download.contents, feed_head)
+                    if not parsed_feed:
+                        print(f"RSSFeed could not parse {url} within the size and time budget")
+                        return None
+
+                    return (download, *parsed_feed)
+                except Exception as e:
+                    print(time.strftime("%X %x %Z"))
+                    print(f"in rssfeed.poll_feed for {url}")
+                    print(e)
+                    return None
+
+    def get_host_workers(self, url):
+        host = urlparse(url).netloc.lower()
+        if host not in self.host_workers:
+            self.host_workers[host] = asyncio.Semaphore(settings.rss_poll_workers_per_host)
+        return self.host_workers[host]
+
+    async def post_new_entries(self, url, channel_list, online_entries):
+        entries_by_id = {}
+        for one_entry in online_entries:
+            entries_by_id.setdefault(str(one_entry["link"]), one_entry)
+
+        new_entry_ids = await history.filter_unseen(self.bot.db, "rssfeed_history", "entry_id", list(entries_by_id),
+                                                    "url", str(url))
+        if not new_entry_ids:
+            return []
+
+        sent_messages = []
+        for entry_id in new_entry_ids:
+            one_entry = entries_by_id[entry_id]
+            embed = await self.rss_entry_embed(one_entry)
+            if not embed:
+                print("RSSFeed embed returned nothing. this should not happen")
+                continue
+
+            for channel_id in channel_list:
+                channel = self.bot.get_channel(int(channel_id))
+                if not channel:
+                    await self.bot.db.write("DELETE FROM rssfeed_channels WHERE channel_id = ?",
+                                            [int(channel_id)])
+                    self.bot.subscriptions.remove_channel("rss", channel_id)
+                    print(f"channel with id {channel_id} no longer exists "
+                          "so I am removing it from the list")
+                    continue
+
+                sent_messages.append(self.bot.post_dispatcher.send(channel, embed=embed))
+
+        await asyncio.gather(*sent_messages)
+        await history.record_seen(self.bot.db, "rssfeed_history",
+                                  [(str(url), entry_id) for entry_id in new_entry_ids])
+        return new_entry_ids
+
+    def learn_entry_order(self, url, online_entries, new_entry_ids):
+        """
+        The parser may only stop early on feeds that list new entries first.
+        Oldest-first feeds, or feeds that pin old entries at the top, are read in full.
+        """
+
+        verdict = new_entries_first(online_entries, set(new_entry_ids))
+        if verdict is None:
+            return
+        if verdict:
+            self.new_entries_first.add(url)
+        elif url in self.new_entries_first:
+            print(f"RSSFeed {url} listed a new entry below old ones, reading it in full from now on")
+            self.new_entries_first.discard(url)
 
 
 def setup(bot):
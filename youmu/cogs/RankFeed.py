@@ -4,6 +4,8 @@ import discord
 from discord.ext import commands
 
 from youmu.modules import permissions
+from youmu.modules import history
+from youmu.modules import metrics
 from youmu.reusables import send_large_message
 from youmu.embeds import newembeds
 
@@ -23,20 +25,15 @@ class RankFeed(commands.Cog):
         Start sending information about the latest ranked maps in the channel this command is typed in.
         """
 
-        fresh_entries = await self.bot.osuweb.scrape_latest_ranked_beatmapsets_array()
+        async with self.bot.osuweb_limiter:
+            fresh_entries = await self.bot.osuweb.scrape_latest_ranked_beatmapsets_array()
         if not fresh_entries:
             await ctx.send("Connection issues with osu website???")
             return
 
-        for mapset_metadata in fresh_entries["beatmapsets"]:
-            mapset_id = mapset_metadata["id"]
-            async with await self.bot.db.execute("SELECT mapset_id FROM rankfeed_history WHERE mapset_id = ?",
-                                                 [int(mapset_id)]) as cursor:
-                check_is_already_in_history = await cursor.fetchone()
-            if not check_is_already_in_history:
-                await self.bot.db.execute("INSERT INTO rankfeed_history VALUES (?)", [int(mapset_id)])
-
-        await self.bot.db.commit()
+        mapset_ids = [int(mapset_metadata["id"]) for mapset_metadata in fresh_entries["beatmapsets"]]
+        new_mapset_ids = await history.filter_unseen(self.bot.db, "rankfeed_history", "mapset_id", mapset_ids)
+        await history.record_seen(self.bot.db, "rankfeed_history", [(mapset_id,) for mapset_id in new_mapset_ids])
 
         async with await self.bot.db.execute("SELECT channel_id FROM rankfeed_channel_list WHERE channel_id = ?",
                                              [int(ctx.channel.id)]) as cursor:
@@ -46,9 +43,10 @@ class RankFeed(commands.Cog):
             return
 
         await self.bot.db.execute("INSERT INTO rankfeed_channel_list VALUES (?)", [int(ctx.channel.id)])
-        await ctx.send(":ok_hand:")
+        await self.bot.db.flush()
+        self.bot.subscriptions.add("rankfeed", None, ctx.channel.id)
 
-        await self.bot.db.commit()
+        await ctx.send(":ok_hand:")
 
     @commands.command(name="rankfeed_remove", brief="Remove a rankfeed from the current channel")
     @commands.check(permissions.is_admin)
@@ -59,7 +57,8 @@ class RankFeed(commands.Cog):
         """
 
         await self.bot.db.execute("DELETE FROM rankfeed_channel_list WHERE channel_id = ?", [int(ctx.channel.id)])
-        await self.bot.db.commit()
+        await self.bot.db.flush()
+        self.bot.subscriptions.remove("rankfeed", None, ctx.channel.id)
         await ctx.send(":ok_hand:")
 
     @commands.command(name="rankfeed_tracklist", brief="Show a list of channels where rankfeed is sent")
@@ -88,68 +87,82 @@ class RankFeed(commands.Cog):
         await self.bot.wait_until_ready()
         while not self.bot.is_closed():
             try:
-                await asyncio.sleep(10)
+                await self.bot.clock.sleep(10)
 
-                async with await self.bot.db.execute("SELECT channel_id FROM rankfeed_channel_list") as cursor:
-                    rankfeed_channel_list = await cursor.fetchall()
+                rankfeed_channel_list = self.bot.subscriptions.channels("rankfeed")
                 if not rankfeed_channel_list:
                     # Rankfeed is not enabled
-                    await asyncio.sleep(3600)
+                    await self.bot.clock.sleep(3600)
                     continue
 
-                async with await self.bot.db.execute("SELECT mapset_id FROM rankfeed_history") as cursor:
-                    rankfeed_history_check = await cursor.fetchall()
+                async with await self.bot.db.execute("SELECT mapset_id FROM rankfeed_history LIMIT 1") as cursor:
+                    rankfeed_history_check = await cursor.fetchone()
                 if not rankfeed_history_check:
                     print("no maps in history so i stop so i don't spam")
-                    await asyncio.sleep(3600)
+                    await self.bot.clock.sleep(3600)
                     continue
 
                 print(time.strftime("%X %x %Z") + " | performing rankfeed check")
+                started_at = time.monotonic()
 
-                fresh_entries = await self.bot.osuweb.scrape_latest_ranked_beatmapsets_array()
-                if not fresh_entries:
+                if await self.check_ranked(rankfeed_channel_list) is None:
                     print("rankfeed connection issues with osu website???")
-                    await asyncio.sleep(3600)
+                    await self.bot.clock.sleep(3600)
                     continue
 
-                for mapset_metadata in fresh_entries["beatmapsets"]:
-                    if mapset_metadata["status"] != "ranked":
-                        continue
-
-                    mapset_id = mapset_metadata["id"]
-                    async with await self.bot.db.execute("SELECT mapset_id FROM rankfeed_history WHERE mapset_id = ?",
-                                                         [int(mapset_id)]) as cursor:
-                        check_is_already_in_history = await cursor.fetchone()
-                    if check_is_already_in_history:
-                        continue
-
-                    embed = await newembeds.beatmapset_array(mapset_metadata, color=0xffc85a)
-                    if not embed:
-                        print("rankfeed embed returned nothing. this should not happen")
-                        continue
-
-                    for rankfeed_channel_id in rankfeed_channel_list:
-                        channel = self.bot.get_channel(int(rankfeed_channel_id[0]))
-                        if not channel:
-                            await self.bot.db.execute("DELETE FROM rankfeed_channel_list WHERE channel_id = ?",
-                                                      [int(rankfeed_channel_id[0])])
-                            await self.bot.db.commit()
-                            print(f"channel with id {rankfeed_channel_id[0]} no longer exists "
-                                  "so I am removing it from the list")
-                            continue
-
-                        await channel.send(embed=embed)
-
-                    await self.bot.db.execute("INSERT INTO rankfeed_history VALUES (?)", [int(mapset_id)])
-                    await self.bot.db.commit()
-
+                metrics.loop_pass_seconds.observe(time.monotonic() - started_at, "rankfeed")
                 print(time.strftime("%X %x %Z") + " | finished rankfeed check")
-                await asyncio.sleep(3600)
+                await self.bot.clock.sleep(3600)
             except Exception as e:
                 print(time.strftime("%X %x %Z"))
                 print("in rankfeed_background_loop")
                 print(e)
-                await asyncio.sleep(3600)
+                await self.bot.clock.sleep(3600)
+
+    async def check_ranked(self, rankfeed_channel_list):
+        """
+        One pass: post the newly ranked mapsets to every channel.
+        Returns how many mapsets were new, or None if the osu! website could not be reached.
+        """
+
+        async with self.bot.osuweb_limiter:
+            fresh_entries = await self.bot.osuweb.scrape_latest_ranked_beatmapsets_array()
+        if not fresh_entries:
+            return None
+
+        ranked_mapsets = {}
+        for mapset_metadata in fresh_entries["beatmapsets"]:
+            if mapset_metadata["status"] != "ranked":
+                continue
+            ranked_mapsets[int(mapset_metadata["id"])] = mapset_metadata
+
+        new_mapset_ids = await history.filter_unseen(self.bot.db, "rankfeed_history", "mapset_id",
+                                                     list(ranked_mapsets))
+
+        sent_messages = []
+        for mapset_id in new_mapset_ids:
+            mapset_metadata = ranked_mapsets[mapset_id]
+            embed = await newembeds.beatmapset_array(mapset_metadata, color=0xffc85a)
+            if not embed:
+                print("rankfeed embed returned nothing. this should not happen")
+                continue
+
+            for rankfeed_channel_id in rankfeed_channel_list:
+                channel = self.bot.get_channel(int(rankfeed_channel_id))
+                if not channel:
+                    await self.bot.db.write("DELETE FROM rankfeed_channel_list WHERE channel_id = ?",
+                                            [int(rankfeed_channel_id)])
+                    self.bot.subscriptions.remove_channel("rankfeed", rankfeed_channel_id)
+                    print(f"channel with id {rankfeed_channel_id} no longer exists "
+                          "so I am removing it from the list")
+                    continue
+
+                sent_messages.append(self.bot.post_dispatcher.send(channel, embed=embed))
+
+        await asyncio.gather(*sent_messages)
+        await history.record_seen(self.bot.db, "rankfeed_history",
+                                  [(mapset_id,) for mapset_id in new_mapset_ids])
+        return len(new_mapset_ids)
 
 
 def setup(bot):
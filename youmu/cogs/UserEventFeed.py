@@ -1,8 +1,12 @@
 import asyncio
 import time
+from functools import partial
 import discord
 from discord.ext import commands
 from youmu.modules import permissions
+from youmu.modules import history
+from youmu.modules import settings
+from youmu.modules import metrics
 from youmu.reusables import send_large_message
 from youmu.reusables import list_helpers
 from youmu.embeds import oldembeds
@@ -11,6 +15,8 @@ from youmu.embeds import oldembeds
 class UserEventFeed(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        # osu_id -> checks in a row that get_user came back empty
+        self.missed_checks = {}
         self.bot.background_tasks.append(
             self.bot.loop.create_task(self.usereventfeed_background_loop())
         )
@@ -36,13 +42,10 @@ class UserEventFeed(commands.Cog):
         if not check_is_already_tracked:
             await self.bot.db.execute("INSERT INTO usereventfeed_tracklist VALUES (?)", [int(user.id)])
 
-        for event in user.events:
-            async with await self.bot.db.execute("SELECT event_id FROM usereventfeed_history WHERE event_id = ?",
-                                                 [int(event.id)]) as cursor:
-                check_is_already_in_history = await cursor.fetchone()
-            if not check_is_already_in_history:
-                await self.bot.db.execute("INSERT INTO usereventfeed_history VALUES (?, ?, ?)",
-                                          [int(user.id), int(event.id), int(time.time())])
+        event_ids = [int(event.id) for event in user.events]
+        new_event_ids = await history.filter_unseen(self.bot.db, "usereventfeed_history", "event_id", event_ids)
+        await history.record_seen(self.bot.db, "usereventfeed_history",
+                                  [(int(user.id), event_id, int(self.bot.clock.time())) for event_id in new_event_ids])
 
         async with await self.bot.db.execute("SELECT channel_id FROM usereventfeed_channels "
                                              "WHERE channel_id = ? AND osu_id = ?",
@@ -54,9 +57,10 @@ class UserEventFeed(commands.Cog):
 
         await self.bot.db.execute("INSERT INTO usereventfeed_channels VALUES (?, ?)",
                                   [int(user.id), int(ctx.channel.id)])
-        await ctx.send(f"Tracked `{user.name}` in this channel")
+        await self.bot.db.flush()
+        self.bot.subscriptions.add("uef", int(user.id), ctx.channel.id)
 
-        await self.bot.db.commit()
+        await ctx.send(f"Tracked `{user.name}` in this channel")
 
     @commands.command(name="uef_untrack", brief="Stop tracking the mapping activity of the specified user")
     @commands.check(permissions.is_admin)
@@ -77,7 +81,8 @@ class UserEventFeed(commands.Cog):
 
         await self.bot.db.execute("DELETE FROM usereventfeed_channels WHERE osu_id = ? AND channel_id = ? ",
                                   [int(user_id), int(ctx.channel.id)])
-        await self.bot.db.commit()
+        await self.bot.db.flush()
+        self.bot.subscriptions.remove("uef", int(user_id), ctx.channel.id)
 
         await ctx.send(f"`{user_name}` is no longer tracked in this channel")
 
@@ -117,66 +122,102 @@ class UserEventFeed(commands.Cog):
         await self.bot.wait_until_ready()
         while not self.bot.is_closed():
             try:
-                await asyncio.sleep(10)
+                await self.bot.clock.sleep(10)
 
                 async with await self.bot.db.execute("SELECT osu_id FROM usereventfeed_tracklist") as cursor:
                     tracklist = await cursor.fetchall()
                 if not tracklist:
                     # UEF tracklist is empty
-                    await asyncio.sleep(3600)
+                    await self.bot.clock.sleep(3600)
                     continue
 
                 print(time.strftime("%X %x %Z") + " | performing user event check")
-                for user_id in tracklist:
-                    await self.prepare_to_check(user_id[0])
-                print(time.strftime("%X %x %Z") + " | finished user event check")
-                await asyncio.sleep(3600)
+                await self.check_users(list_helpers.unnest_list(tracklist))
+                await self.bot.clock.sleep(3600)
             except Exception as e:
                 print(time.strftime("%X %x %Z"))
                 print("in usereventfeed_background_loop")
                 print(e)
-                await asyncio.sleep(7200)
+                await self.bot.clock.sleep(7200)
+
+    async def check_users(self, user_ids):
+        """
+        Check all tracked users with a bounded pool of workers.
+        One user's failure is logged and does not abort the pass.
+        """
+
+        started_at = time.monotonic()
+        queue = asyncio.Queue()
+        for user_id in user_ids:
+            queue.put_nowait(user_id)
+        failed_user_ids = []
+
+        async def worker():
+            while not queue.empty():
+                user_id = queue.get_nowait()
+                try:
+                    await self.prepare_to_check(user_id)
+                except Exception as e:
+                    print(time.strftime("%X %x %Z"))
+                    print(f"in usereventfeed.check_users for {user_id}")
+                    print(e)
+                    failed_user_ids.append(user_id)
+
+        worker_count = max(1, min(settings.uef_check_workers, len(user_ids)))
+        await asyncio.gather(*[worker() for _ in range(worker_count)])
+
+        duration = time.monotonic() - started_at
+        metrics.loop_pass_seconds.observe(duration, "usereventfeed")
+        print(time.strftime("%X %x %Z") + f" | finished user event check of {len(user_ids)} users "
+                                          f"in {duration:.1f}s, {len(failed_user_ids)} failed")
+        return failed_user_ids
 
     async def prepare_to_check(self, user_id):
         user = await self.bot.osu.get_user(u=user_id, event_days="2")
         if not user:
+            # an API hiccup looks the same as a restriction, so only untrack after a few misses in a row
+            misses = self.missed_checks.get(int(user_id), 0) + 1
+            if misses < settings.uef_untrack_after_misses:
+                self.missed_checks[int(user_id)] = misses
+                print(f"{user_id} was not found ({misses}/{settings.uef_untrack_after_misses}), "
+                      f"maybe they are restricted")
+                return
+
+            self.missed_checks.pop(int(user_id), None)
             print(f"{user_id} is restricted, untracking everywhere")
-            await self.bot.db.execute("DELETE FROM usereventfeed_tracklist WHERE osu_id = ?", [int(user.id)])
-            await self.bot.db.execute("DELETE FROM usereventfeed_channels WHERE osu_id = ?", [int(user.id)])
-            await self.bot.db.commit()
+            await self.bot.db.write("DELETE FROM usereventfeed_tracklist WHERE osu_id = ?", [int(user_id)])
+            await self.bot.db.write("DELETE FROM usereventfeed_channels WHERE osu_id = ?", [int(user_id)])
+            self.bot.subscriptions.remove_key("uef", int(user_id))
             return
 
-        async with await self.bot.db.execute("SELECT channel_id FROM usereventfeed_channels WHERE osu_id = ?",
-                                             [int(user.id)]) as cursor:
-            channel_list = await cursor.fetchall()
+        self.missed_checks.pop(int(user_id), None)
+
+        channel_list = self.bot.subscriptions.channels("uef", int(user.id))
         if not channel_list:
-            await self.bot.db.execute("DELETE FROM usereventfeed_tracklist WHERE osu_id = ?", [int(user.id)])
-            await self.bot.db.commit()
+            await self.bot.db.write("DELETE FROM usereventfeed_tracklist WHERE osu_id = ?", [int(user.id)])
             print(f"{user.id} is not tracked in any channel so I am untracking them")
             return
 
-        channel_list = list_helpers.unnest_list(channel_list)
         await self.check_events(channel_list, user)
 
     async def check_events(self, channel_list, user):
         print(time.strftime("%X %x %Z") + f" | currently checking {user.name}")
-        for event in user.events:
-            async with await self.bot.db.execute("SELECT event_id FROM usereventfeed_history WHERE event_id = ?",
-                                                 [int(event.id)]) as cursor:
-                check_is_entry_in_history = await cursor.fetchone()
-            if check_is_entry_in_history:
-                continue
-
-            await self.bot.db.execute("INSERT INTO usereventfeed_history VALUES (?, ?, ?)",
-                                      [int(user.id), int(event.id), int(time.time())])
-            await self.bot.db.commit()
-
+        events_by_id = {int(event.id): event for event in user.events}
+        new_event_ids = await history.filter_unseen(self.bot.db, "usereventfeed_history", "event_id",
+                                                    list(events_by_id))
+        await history.record_seen(self.bot.db, "usereventfeed_history",
+                                  [(int(user.id), event_id, int(self.bot.clock.time())) for event_id in new_event_ids])
+
+        sent_messages = []
+        for event_id in new_event_ids:
+            event = events_by_id[event_id]
             event_color = await self.get_event_color(event.display_text)
             if not event_color:
                 # this is not the kind of event we are interested in posting
                 continue
 
-            result = await self.bot.osu.get_beatmapset(s=event.beatmapset_id)
+            result = await self.bot.beatmapset_cache.get(int(event.beatmapset_id),
+                                                         partial(self.bot.osu.get_beatmapset, s=event.beatmapset_id))
             embed = await oldembeds.beatmapset(result, event_color)
             if not embed:
                 print("uef track embed didn't return anything, this should not happen")
@@ -186,14 +227,16 @@ class UserEventFeed(commands.Cog):
             for channel_id in channel_list:
                 channel = self.bot.get_channel(int(channel_id))
                 if not channel:
-                    await self.bot.db.execute("DELETE FROM usereventfeed_channels WHERE channel_id = ?",
-                                              [int(channel_id)])
-                    await self.bot.db.commit()
+                    await self.bot.db.write("DELETE FROM usereventfeed_channels WHERE channel_id = ?",
+                                            [int(channel_id)])
+                    self.bot.subscriptions.remove_channel("uef", channel_id)
                     print(f"channel with id {channel_id} no longer exists "
                           "so I am removing it from the list")
                     continue
 
-                await channel.send(display_text, embed=embed)
+                sent_messages.append(self.bot.post_dispatcher.send(channel, display_text, embed=embed))
+
+        await asyncio.gather(*sent_messages)
 
     async def get_event_color(self, string):
         if "has submitted" in string:
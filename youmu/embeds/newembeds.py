@@ -1,5 +1,4 @@
 import discord
-import dateutil.parser
 from discord.utils import escape_markdown
 
 default_embed_color = 0xffffff
@@ -68,6 +67,8 @@ async def user_array(user, color=None, custom_footer=None):
 
         body += "\n"
 
+        import dateutil.parser
+
         join_date = dateutil.parser.parse(user['join_date'])
         body += f"**Joined osu on:** {str(join_date.isoformat(' '))}\n"
 
@@ -159,6 +160,8 @@ async def small_user_array(user, color=None, custom_footer=None):
 
         body += "\n"
 
+        import dateutil.parser
+
         join_date = dateutil.parser.parse(user['join_date'])
         body += f"**Joined osu on:** {str(join_date.isoformat(' '))}\n"
 
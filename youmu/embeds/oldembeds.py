@@ -1,5 +1,4 @@
 import discord
-import pycountry
 
 from discord.utils import escape_markdown
 
@@ -46,6 +45,8 @@ async def user(user, color=default_embed_color, custom_footer=""):
         body = ""
 
         if user.country:
+            import pycountry
+
             try:
                 country = pycountry.countries.get(alpha_2=user.country.upper())
                 country_flag_emote = f":flag_{country.alpha_2.lower()}:"
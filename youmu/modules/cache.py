@@ -0,0 +1,71 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class AsyncTTLCache:
+    """
+    Bounded LRU cache whose entries expire after `ttl` seconds.
+    Concurrent lookups of the same key share one in-flight fetch (single-flight).
+    None results are not cached, so a failed API call is retried next time.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.in_flight = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get(self, key, fetch):
+        """
+        Return the cached value for key, or await fetch() to get it.
+
+        fetch: a callable that takes no arguments and returns an awaitable.
+        """
+
+        entry = self.entries.get(key)
+        if entry:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self.entries[key]
+
+        task = self.in_flight.get(key)
+        if task:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(fetch())
+            self.in_flight[key] = task
+            task.add_done_callback(lambda done_task: self.finish(key, done_task))
+
+        # one caller getting cancelled must not cancel the fetch for everyone else
+        return await asyncio.shield(task)
+
+    def finish(self, key, task):
+        self.in_flight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        if task.result() is not None:
+            self.set(key, task.result())
+
+    def set(self, key, value):
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        if key is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(key, None)
+
+    def __len__(self):
+        return len(self.entries)
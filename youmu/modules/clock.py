@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+from youmu.modules import settings
+
+
+class Clock:
+    """
+    Wall clock time and sleeping, for the background loops.
+    The loops go through bot.clock instead of asyncio.sleep and time.time, so a simulation can speed them up.
+    """
+
+    def time(self):
+        return time.time()
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds)
+
+
+class ScaledClock(Clock):
+    """
+    A clock that runs `speed` times faster than real time: sleeps are shortened and time() runs ahead.
+    With a speed of 3600, a simulated hour of polling takes a second.
+    """
+
+    def __init__(self, speed):
+        self.speed = speed
+        self.started_at = time.time()
+        self.started_at_monotonic = time.monotonic()
+
+    def time(self):
+        return self.started_at + (time.monotonic() - self.started_at_monotonic) * self.speed
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds / self.speed)
+
+
+def create_clock():
+    if settings.clock_speed != 1:
+        return ScaledClock(settings.clock_speed)
+    return Clock()
@@ -2,46 +2,35 @@ import os
 from youmu.modules.storage_management import dirs
 
 
-if os.environ.get('YOUMU_TOKEN'):
-    bot_token = os.environ.get('YOUMU_TOKEN')
-else:
-    try:
-        with open(dirs.user_data_dir + "/token.txt", "r+") as token_file:
-            bot_token = token_file.read().strip()
-    except FileNotFoundError as e:
-        print("i need a bot token. either set YOUMU_TOKEN environment variable")
-        print("or put it in token.txt in my AppData/.config folder")
-        raise SystemExit
+def read_credential(environment_variable, file_name, description):
+    """
+    Credentials are read when they are first needed, not at import,
+    so importing the bot's modules does not touch the credential files.
+    """
 
-if os.environ.get('YOUMU_OSU_API_KEY'):
-    osu_api_key = os.environ.get('YOUMU_OSU_API_KEY')
-else:
-    try:
-        with open(dirs.user_data_dir + "/osu_api_key.txt", "r+") as token_file:
-            osu_api_key = token_file.read().strip()
-    except FileNotFoundError as e:
-        print("i need a osu api key. either set YOUMU_OSU_API_KEY environment variable")
-        print("or put it in token.txt in my AppData/.config folder")
-        raise SystemExit
+    if os.environ.get(environment_variable):
+        return os.environ.get(environment_variable)
 
-if os.environ.get('YOUMU_CLIENT_ID'):
-    client_id = os.environ.get('YOUMU_CLIENT_ID')
-else:
     try:
-        with open(dirs.user_data_dir + "/client_id.txt", "r+") as token_file:
-            client_id = token_file.read().strip()
+        with open(dirs.user_data_dir + "/" + file_name, "r+") as token_file:
+            return token_file.read().strip()
     except FileNotFoundError as e:
-        print("i need a osu web client id. either set YOUMU_CLIENT_ID environment variable")
-        print("or put it in token.txt in my AppData/.config folder")
+        print(f"i need a {description}. either set {environment_variable} environment variable")
+        print(f"or put it in {file_name} in my AppData/.config folder")
         raise SystemExit
 
-if os.environ.get('YOUMU_CLIENT_SECRET'):
-    client_secret = os.environ.get('YOUMU_CLIENT_SECRET')
-else:
-    try:
-        with open(dirs.user_data_dir + "/client_secret.txt", "r+") as token_file:
-            client_secret = token_file.read().strip()
-    except FileNotFoundError as e:
-        print("i need a osu web client secret. either set YOUMU_CLIENT_SECRET environment variable")
-        print("or put it in token.txt in my AppData/.config folder")
-        raise SystemExit
+
+def bot_token():
+    return read_credential("YOUMU_TOKEN", "token.txt", "bot token")
+
+
+def osu_api_key():
+    return read_credential("YOUMU_OSU_API_KEY", "osu_api_key.txt", "osu api key")
+
+
+def client_id():
+    return read_credential("YOUMU_CLIENT_ID", "client_id.txt", "osu web client id")
+
+
+def client_secret():
+    return read_credential("YOUMU_CLIENT_SECRET", "client_secret.txt", "osu web client secret")
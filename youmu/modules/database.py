@@ -0,0 +1,196 @@
+import asyncio
+import time
+
+import aiosqlite
+
+from youmu.modules import settings
+from youmu.modules import metrics
+
+
+class CountingCursor:
+    """
+    Wraps the result of aiosqlite's execute() and counts the rows that are fetched through it.
+    Like the original it can be awaited or used directly with `async with`.
+    """
+
+    def __init__(self, result):
+        self.result = result
+        self.cursor = None
+
+    async def open(self):
+        if self.cursor is None:
+            self.cursor = await self.result
+        return self
+
+    def __await__(self):
+        return self.open().__await__()
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.cursor.close()
+
+    async def fetchone(self):
+        row = await self.cursor.fetchone()
+        if row is not None:
+            metrics.db_rows_read.inc()
+        return row
+
+    async def fetchall(self):
+        rows = await self.cursor.fetchall()
+        metrics.db_rows_read.inc(amount=len(rows))
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+class Database:
+    """
+    The bot's single database connection, shared by all cogs.
+
+    The database runs in WAL mode, so readers do not wait for writers and commits are cheap.
+    Writes from the background loops go through write(), write_many() and write_batch(). They are queued and applied
+    in order, then committed together once the queue is db_commit_delay seconds old
+    or db_commit_batch statements long, so the cogs share one fsync instead of paying for one each.
+
+    Queued writes are not visible to reads until they are flushed.
+    Command handlers that need read-your-writes, or that report success to a user, call flush().
+    execute() and executemany() go straight to the connection, exactly like aiosqlite.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.pending = []
+        self.flush_lock = asyncio.Lock()
+        self.flush_timer = None
+        self.dirty = False
+        self.total_changes = 0
+
+    @classmethod
+    async def connect(cls, database_file):
+        connection = await aiosqlite.connect(database_file)
+        async with connection.execute("PRAGMA journal_mode = WAL") as cursor:
+            await cursor.fetchone()
+        await connection.execute("PRAGMA synchronous = NORMAL")
+        return cls(connection)
+
+    def execute(self, sql, parameters=None):
+        return CountingCursor(self.connection.execute(sql, parameters))
+
+    def executemany(self, sql, parameters):
+        return self.connection.executemany(sql, parameters)
+
+    async def write(self, sql, parameters=None):
+        self.pending.append([(sql, [parameters or []])])
+        await self.schedule_flush()
+
+    async def write_many(self, sql, parameters):
+        parameters = list(parameters)
+        if not parameters:
+            return
+        self.pending.append([(sql, parameters)])
+        await self.schedule_flush()
+
+    async def write_batch(self, statements):
+        """
+        Queue several writes as one unit. statements are (sql, list of parameter rows) pairs.
+        A flush never splits them up, and if one of them fails, none of them are applied.
+        """
+
+        statements = [(sql, list(parameters)) for sql, parameters in statements]
+        statements = [(sql, parameters) for sql, parameters in statements if parameters]
+        if not statements:
+            return
+        self.pending.append(statements)
+        await self.schedule_flush()
+
+    async def commit(self):
+        """
+        Group commit: writes made directly through execute() are committed
+        together with the queued writes, within db_commit_delay seconds.
+        Use flush() to commit right now.
+        """
+
+        self.dirty = True
+        await self.schedule_flush()
+
+    async def schedule_flush(self):
+        if sum(len(parameters) for unit in self.pending for _, parameters in unit) >= settings.db_commit_batch:
+            await self.flush()
+        elif not self.flush_timer or self.flush_timer.done():
+            self.flush_timer = asyncio.ensure_future(self.delayed_flush())
+
+    async def delayed_flush(self):
+        while True:
+            await asyncio.sleep(settings.db_commit_delay)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(time.strftime("%X %x %Z"))
+                print("in database.delayed_flush")
+                print(e)
+
+            # writes that came in while flushing are picked up by the next round
+            if not self.pending and not self.dirty:
+                return
+
+    async def flush(self):
+        """
+        Apply all queued writes in order and commit them, together with any direct writes, in one transaction.
+        A failing write is logged and skipped, it does not take the other cogs' writes down with it.
+        A batch from write_batch() is skipped as a whole.
+        """
+
+        async with self.flush_lock:
+            pending, self.pending = self.pending, []
+            self.dirty = False
+
+            for unit in pending:
+                if len(unit) == 1:
+                    try:
+                        await self.apply_write(*unit[0])
+                    except Exception as e:
+                        print(time.strftime("%X %x %Z"))
+                        print(f"in database.flush, dropping: {unit[0][0]}")
+                        print(e)
+                    continue
+
+                await self.connection.execute("SAVEPOINT write_batch")
+                try:
+                    for sql, parameters in unit:
+                        await self.apply_write(sql, parameters)
+                except Exception as e:
+                    await self.connection.execute("ROLLBACK TO write_batch")
+                    print(time.strftime("%X %x %Z"))
+                    print(f"in database.flush, dropping a batch of {len(unit)} writes at: {sql}")
+                    print(e)
+                await self.connection.execute("RELEASE write_batch")
+            await self.connection.commit()
+
+            total_changes = self.connection.total_changes
+            metrics.db_rows_written.inc(amount=total_changes - self.total_changes)
+            metrics.db_commits.inc()
+            self.total_changes = total_changes
+
+    async def apply_write(self, sql, parameters):
+        if len(parameters) == 1:
+            await self.connection.execute(sql, parameters[0])
+        else:
+            await self.connection.executemany(sql, parameters)
+
+    async def checkpoint(self):
+        """
+        Flush, then move everything from the WAL into the main database file, for example before copying it.
+        """
+
+        await self.flush()
+        async with self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)") as cursor:
+            await cursor.fetchone()
+
+    async def close(self):
+        if self.flush_timer:
+            self.flush_timer.cancel()
+        await self.flush()
+        await self.connection.close()
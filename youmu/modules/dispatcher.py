@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+from youmu.modules import settings
+from youmu.modules import metrics
+from youmu.modules.rate_limiter import RateLimiter
+
+
+class PostDispatcher:
+    """
+    Sends feed posts for all cogs.
+    Every channel has its own queue and worker, so posts to different channels go out concurrently
+    while posts to the same channel keep their order.
+    Sends are paced to Discord's buckets: the per-channel bucket of
+    POST /channels/{channel_id}/messages, and the global request limit.
+    """
+
+    def __init__(self):
+        self.queues = {}
+        self.workers = {}
+        self.channel_limiters = {}
+        self.global_limiter = RateLimiter(settings.dispatch_global_rate, 1)
+
+    def send(self, channel, *args, **kwargs):
+        """
+        Queue a message for a channel. Takes the same arguments as channel.send.
+        Returns a future that resolves to the sent message, or None if sending failed.
+        """
+
+        future = asyncio.get_event_loop().create_future()
+        channel_id = int(channel.id)
+        if channel_id not in self.queues:
+            self.queues[channel_id] = asyncio.Queue()
+        self.queues[channel_id].put_nowait((channel, args, kwargs, future))
+        if channel_id not in self.workers:
+            self.workers[channel_id] = asyncio.ensure_future(self.channel_worker(channel_id))
+        return future
+
+    def queue_depth(self, channel_id=None):
+        """
+        Number of messages waiting to be sent, to one channel or in total.
+        """
+
+        if channel_id is not None:
+            if int(channel_id) not in self.queues:
+                return 0
+            return self.queues[int(channel_id)].qsize()
+        return sum(queue.qsize() for queue in self.queues.values())
+
+    def get_channel_limiter(self, channel_id):
+        if channel_id not in self.channel_limiters:
+            self.channel_limiters[channel_id] = RateLimiter(settings.dispatch_channel_rate,
+                                                            settings.dispatch_channel_per)
+        return self.channel_limiters[channel_id]
+
+    async def channel_worker(self, channel_id):
+        queue = self.queues[channel_id]
+        while True:
+            try:
+                channel, args, kwargs, future = await asyncio.wait_for(queue.get(), settings.dispatch_idle_timeout)
+            except asyncio.TimeoutError:
+                if queue.empty():
+                    # nothing can be queued between these lines, there is no await
+                    del self.queues[channel_id]
+                    del self.workers[channel_id]
+                    self.channel_limiters.pop(channel_id, None)
+                    return
+                continue
+
+            try:
+                await self.get_channel_limiter(channel_id).acquire()
+                await self.global_limiter.acquire()
+                message = await channel.send(*args, **kwargs)
+                metrics.messages_sent.inc(channel_id)
+                if not future.done():
+                    future.set_result(message)
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as e:
+                print(time.strftime("%X %x %Z"))
+                print(f"in dispatcher.channel_worker for channel {channel_id}")
+                print(e)
+                metrics.messages_failed.inc(channel_id)
+                if not future.done():
+                    future.set_result(None)
+
+    async def close(self):
+        for worker in self.workers.values():
+            worker.cancel()
+        self.workers = {}
+        self.queues = {}
@@ -0,0 +1,299 @@
+import asyncio
+import multiprocessing
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from xml.etree.ElementTree import ParseError
+from xml.etree.ElementTree import XMLPullParser
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from youmu.modules import settings
+from youmu.modules import feed_scheduler
+
+# the only entry fields rss_entry_embed and the history need, nothing else crosses the process boundary
+entry_fields = ("title", "link", "summary", "published", "author")
+
+# how many of the newest entry IDs of a feed are remembered to stop the next parse early
+feed_head_size = 100
+
+# how much of a document the incremental parser reads before it looks for entries again
+parse_chunk_size = 16384
+
+feed_root_names = ("rss", "feed", "RDF")
+
+
+class ParseTimeout(Exception):
+    pass
+
+
+def raise_parse_timeout(signum, frame):
+    raise ParseTimeout()
+
+
+@contextmanager
+def time_limit(time_budget):
+    """
+    Raise ParseTimeout in the block after time_budget seconds.
+    Only works in a process's main thread, which is where worker processes run their tasks, elsewhere it does nothing.
+    """
+
+    use_alarm = time_budget and hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+    if use_alarm:
+        signal.signal(signal.SIGALRM, raise_parse_timeout)
+        signal.setitimer(signal.ITIMER_REAL, time_budget)
+    try:
+        yield
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def element_text(element):
+    return "".join(element.itertext()).strip()
+
+
+def item_fields(element):
+    """
+    The fields of an RSS <item> or an Atom <entry>, named the way feedparser names them.
+    """
+
+    fields = {}
+    content = None
+    updated = None
+    for child in element:
+        name = local_name(child.tag)
+        if name == "title":
+            fields.setdefault("title", element_text(child))
+        elif name == "link":
+            href = child.get("href")
+            if href is None:
+                fields.setdefault("link", element_text(child))
+            elif child.get("rel", "alternate") == "alternate":
+                fields.setdefault("link", href)
+        elif name in ("description", "summary"):
+            fields.setdefault("summary", element_text(child))
+        elif name in ("content", "encoded"):
+            content = content or element_text(child)
+        elif name in ("pubDate", "published", "issued"):
+            fields.setdefault("published", element_text(child))
+        elif name in ("updated", "modified", "date"):
+            updated = updated or element_text(child)
+        elif name in ("author", "creator"):
+            author_name = next((grandchild for grandchild in child if local_name(grandchild.tag) == "name"), child)
+            fields.setdefault("author", element_text(author_name))
+
+    if "summary" not in fields and content is not None:
+        fields["summary"] = content
+    if "published" not in fields and updated is not None:
+        fields["published"] = updated
+    return fields
+
+
+def iterparse_feed(contents, feed_head, seen_run_length):
+    """
+    Read a well-formed RSS or Atom document a chunk at a time and collect its entries in document order.
+    feed_head is (newest_id, seen_ids) from the previous pass, see parse_feed. With it, the parser stops once
+    seen_run_length entries in a row are in seen_ids, counting from newest_id,
+    so the work depends on how many entries are new, not on the size of the feed.
+    Returns (entries, ttl, complete), complete is False if the parser stopped early.
+    Raises ParseError if the document is not well-formed XML or not a feed.
+    """
+
+    newest_id, seen_ids = feed_head or (None, frozenset())
+    parser = XMLPullParser(("start", "end"))
+    entries = []
+    ttl = None
+    seen_run = 0
+    root_checked = False
+
+    for offset in range(0, len(contents), parse_chunk_size):
+        parser.feed(contents[offset:offset + parse_chunk_size])
+        for event, element in parser.read_events():
+            name = local_name(element.tag)
+            if event == "start":
+                if not root_checked:
+                    if name not in feed_root_names:
+                        raise ParseError(f"<{name}> is not a feed")
+                    root_checked = True
+                continue
+
+            if name == "ttl" and ttl is None:
+                ttl = element_text(element)
+            elif name in ("item", "entry"):
+                fields = item_fields(element)
+                element.clear()
+                if not fields.get("link"):
+                    continue
+                entries.append(fields)
+
+                # a run only starts at the entry that was newest last time, not at any seen entry
+                if fields["link"] == newest_id or (seen_run and fields["link"] in seen_ids):
+                    seen_run += 1
+                    if seen_run >= seen_run_length:
+                        return entries, ttl, False
+                else:
+                    seen_run = 0
+
+    parser.close()
+    if not root_checked:
+        raise ParseError("empty document")
+    return entries, ttl, True
+
+
+def feedparser_feed(contents):
+    # feedparser is slow to import and only needed for feeds the incremental parser gives up on
+    import feedparser
+
+    parsed = feedparser.parse(contents)
+    entries = []
+    for entry in parsed["entries"]:
+        if "link" not in entry:
+            continue
+        entries.append({field: str(entry[field]) for field in entry_fields if field in entry})
+    return entries, parsed["feed"].get("ttl"), True
+
+
+def new_entries_first(entries, new_ids):
+    """
+    Whether a fully parsed feed lists its new entries above the ones it had before.
+    Returns None if there is nothing to tell from, when the entries are all new or all old.
+    """
+
+    seen_old_entry = False
+    seen_new_entry = False
+    for entry in entries:
+        if entry["link"] in new_ids:
+            if seen_old_entry:
+                return False
+            seen_new_entry = True
+        else:
+            seen_old_entry = True
+    if not (seen_old_entry and seen_new_entry):
+        return None
+    return True
+
+
+def parse_feed(contents, feed_head=None, time_budget=None):
+    """
+    Parse a feed document. This runs in a worker, not on the event loop.
+    Well-formed documents go through the incremental parser, anything else falls back to feedparser,
+    which reads the whole document.
+
+    feed_head: (newest_id, seen_ids) from the previous pass, only for feeds known to list new entries first.
+    The incremental parser then stops at a run of seen entries that starts at newest_id.
+    Without it the whole document is read.
+
+    Returns (entries, ttl, skip_hours, complete), where entries are plain dicts with only the fields
+    in entry_fields, and complete says whether every entry of the document is in entries.
+    Entries without a link are dropped, they can not be told apart.
+
+    time_budget: seconds, enforced with a timer signal when running in a worker process.
+    """
+
+    with time_limit(time_budget):
+        try:
+            entries, ttl, complete = iterparse_feed(contents, feed_head, settings.rss_seen_run_length)
+        except ParseError:
+            entries, ttl, complete = feedparser_feed(contents)
+
+    return entries, feed_scheduler.parse_ttl(ttl), feed_scheduler.parse_skip_hours(contents), complete
+
+
+def worker_context():
+    """
+    Workers are started from a fork server, or spawned where there is none.
+    The pool is created after the aiosqlite and discord.py threads are running,
+    and a plain fork would copy locks those threads may be holding into the workers.
+    """
+
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        # the fork server imports the parser once, and not the bot's main script
+        context.set_forkserver_preload(["youmu.modules.feed_parsing"])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+class FeedParserPool:
+    """
+    Runs parse_feed in a process pool (or a thread pool), with a size and a time budget per document.
+    """
+
+    def __init__(self, kind=None, workers=None):
+        self.kind = kind or settings.rss_parser_executor
+        self.workers = workers or settings.rss_parser_workers
+        self.executor = None
+
+    def get_executor(self):
+        if not self.executor:
+            if self.kind == "process":
+                self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=worker_context())
+            else:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="feedparser")
+        return self.executor
+
+    async def parse(self, contents, feed_head=None):
+        """
+        Returns (entries, ttl, skip_hours, complete), or None if the document is over the size budget
+        or took too long to parse. See parse_feed.
+        """
+
+        if not contents or len(contents) > settings.rss_max_parse_bytes:
+            return None
+
+        loop = asyncio.get_event_loop()
+        executor = self.get_executor()
+        try:
+            return await asyncio.wait_for(
+                loop.run_in_executor(executor, parse_feed, contents, feed_head, settings.rss_parse_timeout),
+                # a thread can not be interrupted, so also stop waiting for it
+                settings.rss_parse_timeout + 1
+            )
+        except ParseTimeout:
+            return None
+        except (BrokenProcessPool, asyncio.TimeoutError) as e:
+            # a dead worker breaks the whole pool, and a stuck one keeps its slot, so start over with a new one
+            print(time.strftime("%X %x %Z"))
+            print(f"in feed_parsing.parse, replacing the worker pool: {type(e).__name__} {e}")
+            self.reset(executor)
+            return None
+        except asyncio.CancelledError:
+            # this parse was still queued when another one reset the pool
+            if executor is not self.executor:
+                return None
+            raise
+
+    def reset(self, executor):
+        """
+        Throw away a broken or stuck pool, the next parse starts a fresh one.
+        Several parses may fail on the same pool, only the first one replaces it.
+        """
+
+        if executor is not self.executor:
+            return
+        self.executor = None
+        self.shutdown(executor)
+
+    def shutdown(self, executor):
+        if hasattr(executor, "terminate_workers"):
+            executor.terminate_workers()
+            return
+
+        # before Python 3.14 there is no public way to stop a worker that is still busy,
+        # and shutdown() forgets the processes, so take them first
+        processes = list((getattr(executor, "_processes", None) or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+    def close(self):
+        if self.executor:
+            self.shutdown(self.executor)
+            self.executor = None
@@ -0,0 +1,173 @@
+import heapq
+import re
+import time
+
+from youmu.modules.clock import Clock
+
+skip_hours_pattern = re.compile(r"<skipHours>(.*?)</skipHours>", re.DOTALL | re.IGNORECASE)
+hour_pattern = re.compile(r"<hour>\s*(\d+)\s*</hour>", re.IGNORECASE)
+max_age_pattern = re.compile(r"max-age\s*=\s*(\d+)", re.IGNORECASE)
+
+
+def parse_ttl(ttl):
+    """
+    RSS <ttl> is in minutes. Returns seconds, or None if there is no usable ttl.
+    """
+
+    try:
+        ttl = int(str(ttl).strip())
+    except (TypeError, ValueError):
+        return None
+    if ttl <= 0:
+        return None
+    return ttl * 60
+
+
+def parse_skip_hours(contents):
+    """
+    Returns the set of UTC hours listed in a feed's <skipHours>, empty if there are none.
+    """
+
+    if not contents:
+        return frozenset()
+    if isinstance(contents, bytes):
+        # the element and the hours are plain ASCII, whatever the document's encoding is
+        contents = contents.decode("latin-1")
+    match = skip_hours_pattern.search(contents)
+    if not match:
+        return frozenset()
+    # some feeds use 24 for midnight
+    return frozenset(int(hour) % 24 for hour in hour_pattern.findall(match.group(1)))
+
+
+def parse_max_age(cache_control):
+    """
+    Returns the max-age of a Cache-Control header in seconds, or None.
+    """
+
+    if not cache_control:
+        return None
+    if "no-cache" in cache_control.lower() or "no-store" in cache_control.lower():
+        return None
+    match = max_age_pattern.search(cache_control)
+    if not match:
+        return None
+    return int(match.group(1))
+
+
+class FeedScheduler:
+    """
+    Decides when each feed is polled next.
+    Due times are kept in a priority queue. Every feed has its own interval, which shrinks
+    when a poll finds new entries and grows when it does not, within min_interval and max_interval.
+    Publisher hints (ttl, skipHours, Cache-Control) can push the next poll further out.
+    """
+
+    def __init__(self, min_interval, max_interval, default_interval, growth_factor=1.5, clock=None):
+        self.clock = clock or Clock()
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.default_interval = default_interval
+        self.growth_factor = growth_factor
+
+        self.queue = []
+        self.next_due = {}
+        self.intervals = {}
+        self.ttls = {}
+        self.skip_hours = {}
+
+    def load_interval(self, url, interval):
+        if interval:
+            self.intervals[url] = self.clamp(interval)
+
+    def get_interval(self, url):
+        return self.intervals.get(url, self.default_interval)
+
+    def sync(self, urls, now=None):
+        """
+        Make the schedule match the tracklist. New feeds are due immediately.
+        """
+
+        if now is None:
+            now = self.clock.time()
+        urls = set(urls)
+        for url in urls - set(self.next_due):
+            self.schedule(url, now)
+        for url in set(self.next_due) - urls:
+            self.discard(url)
+
+    def schedule(self, url, due_time):
+        self.next_due[url] = due_time
+        heapq.heappush(self.queue, (due_time, url))
+
+    def discard(self, url):
+        # queue entries of a discarded feed are skipped lazily
+        self.next_due.pop(url, None)
+        self.intervals.pop(url, None)
+        self.ttls.pop(url, None)
+        self.skip_hours.pop(url, None)
+
+    def pop_due(self, now=None):
+        """
+        Remove and return all feeds that are due.
+        They stay off the schedule until they are rescheduled.
+        """
+
+        if now is None:
+            now = self.clock.time()
+        due = []
+        while self.queue and self.queue[0][0] <= now:
+            due_time, url = heapq.heappop(self.queue)
+            if self.next_due.get(url) != due_time:
+                continue
+            del self.next_due[url]
+            due.append(url)
+        return due
+
+    def seconds_until_next_due(self, now=None):
+        if now is None:
+            now = self.clock.time()
+        while self.queue and self.next_due.get(self.queue[0][1]) != self.queue[0][0]:
+            heapq.heappop(self.queue)
+        if not self.queue:
+            return None
+        return max(0.0, self.queue[0][0] - now)
+
+    def reschedule(self, url, new_entries, now=None, ttl=None, skip_hours=None, max_age=None):
+        """
+        Put a feed back on the schedule after it has been polled.
+        ttl and skip_hours are remembered, because a 304 response does not carry them.
+        Returns the delay until the next poll.
+        """
+
+        if now is None:
+            now = self.clock.time()
+
+        interval = self.get_interval(url)
+        if new_entries:
+            interval = interval / self.growth_factor
+        else:
+            interval = interval * self.growth_factor
+        interval = self.clamp(interval)
+        self.intervals[url] = interval
+
+        if ttl is not None:
+            self.ttls[url] = ttl
+        if skip_hours is not None:
+            self.skip_hours[url] = skip_hours
+
+        delay = max(interval, self.ttls.get(url) or 0, max_age or 0)
+        delay = min(delay, self.max_interval)
+
+        self.schedule(url, self.skip(now + delay, self.skip_hours.get(url)))
+        return delay
+
+    def clamp(self, interval):
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def skip(self, due_time, skip_hours):
+        if not skip_hours or len(skip_hours) >= 24:
+            return due_time
+        while time.gmtime(due_time).tm_hour in skip_hours:
+            due_time = (int(due_time) // 3600 + 1) * 3600
+        return due_time
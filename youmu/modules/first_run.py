@@ -1,5 +1,8 @@
+import asyncio
 import sqlite3
-from youmu.modules.storage_management import database_file
+
+from youmu.modules import migrations
+from youmu.modules import permissions
 
 
 async def add_admins(self):
@@ -15,106 +18,25 @@ async def add_admins(self):
         else:
             await self.db.execute("INSERT INTO admins VALUES (?, ?)", [int(app_info.owner.id), 1])
             print(f"Added {app_info.owner.name} to admin list")
-        await self.db.commit()
+        await self.db.flush()
+        await permissions.cache.load(self.db)
 
 
-def ensure_tables():
+def upgrade_database(database_file):
     conn = sqlite3.connect(database_file)
-    c = conn.cursor()
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS "admins" (
-        "user_id"    INTEGER NOT NULL UNIQUE,
-        "permissions"    INTEGER NOT NULL
-    )
-    """)
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS "config" (
-        "setting"    TEXT,
-        "parent"    TEXT,
-        "value"    TEXT,
-        "flag"    TEXT
-    )
-    """)
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS "ignored_users" (
-        "user_id"    INTEGER NOT NULL UNIQUE,
-        "reason"    TEXT
-    )
-    """)
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS "channels" (
-        "setting"    TEXT NOT NULL,
-        "guild_id"    INTEGER NOT NULL,
-        "channel_id"    INTEGER NOT NULL
-    )
-    """)
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS "groupfeed_channel_list" (
-        "channel_id"    INTEGER NOT NULL UNIQUE
-    )
-    """)
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS "groupfeed_group_members" (
-        "osu_id"    INTEGER NOT NULL,
-        "group_id"    INTEGER NOT NULL
-    )
-    """)
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS "groupfeed_member_info" (
-        "osu_id"    INTEGER NOT NULL UNIQUE,
-        "username"    TEXT NOT NULL,
-        "country"    TEXT NOT NULL
-    )
-    """)
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS "ignored_users" (
-        "user_id"    INTEGER NOT NULL UNIQUE,
-        "reason"    TEXT NOT NULL
-    )
-    """)
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS "rankfeed_channel_list" (
-        "channel_id"    INTEGER NOT NULL UNIQUE
-    )
-    """)
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS "rankfeed_history" (
-        "mapset_id"    INTEGER NOT NULL UNIQUE
-    )
-    """)
-    c.execute("""CREATE TABLE IF NOT EXISTS "rssfeed_channels" (
-        "url"    TEXT NOT NULL,
-        "channel_id"    INTEGER NOT NULL
-    )
-    """)
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS "rssfeed_history" (
-        "url"    TEXT NOT NULL,
-        "entry_id"    TEXT NOT NULL UNIQUE
-    )
-    """)
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS "rssfeed_tracklist" (
-        "url"    TEXT NOT NULL UNIQUE
-    )
-    """)
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS "usereventfeed_channels" (
-        "osu_id"    INTEGER NOT NULL,
-        "channel_id"    INTEGER NOT NULL
-    )
-    """)
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS "usereventfeed_history" (
-        "osu_id"    INTEGER NOT NULL,
-        "event_id"    INTEGER NOT NULL UNIQUE,
-        "timestamp"    INTEGER NOT NULL
-    )
-    """)
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS "usereventfeed_tracklist" (
-        "osu_id"    INTEGER NOT NULL UNIQUE
-    )
-    """)
-    conn.commit()
-    conn.close()
+    try:
+        return migrations.upgrade(conn)
+    finally:
+        conn.close()
+
+
+async def ensure_tables(database_file):
+    """
+    Bring the database up to date on a short-lived connection in a worker thread,
+    so the event loop is not blocked. Call this before the bot's own connection is opened.
+    """
+
+    loop = asyncio.get_event_loop()
+    applied = await loop.run_in_executor(None, upgrade_database, database_file)
+    if applied:
+        print(f"Database upgraded to schema version {applied[-1]}")
@@ -0,0 +1,128 @@
+import asyncio
+
+from youmu.modules import settings
+from youmu.modules.seen_set import SeenSet
+
+# SQLite versions before 3.32 only allow 999 bound parameters per statement
+chunk_size = 500
+
+# table: (scope column, id column, position of the scope and of the id in a table row)
+seen_set_keys = {
+    "rssfeed_history": ("url", "entry_id", 0, 1),
+    "usereventfeed_history": (None, "event_id", None, 1),
+    "rankfeed_history": (None, "mapset_id", None, 0),
+}
+
+# table: SeenSet, filled by load_seen_sets
+seen_sets = {}
+
+# table: keys recorded while its seen-set is being built, they are added to it before it is used
+loading_keys = {}
+
+
+def build_seen_set(keys):
+    seen_set = SeenSet(settings.seen_set_capacity)
+    seen_set.load(keys[:settings.seen_set_capacity], complete=len(keys) <= settings.seen_set_capacity)
+    return seen_set
+
+
+async def load_seen_sets(db):
+    """
+    Load a compact copy of every history table into memory, newest rows first,
+    up to seen_set_capacity rows per table.
+    The keys are hashed in a worker thread. Until a table's seen-set is ready, filter_unseen asks the DB.
+    """
+
+    loop = asyncio.get_event_loop()
+    for table in seen_set_keys:
+        loading_keys[table] = []
+    try:
+        # rows queued before this point are written, so the SELECTs below see them
+        await db.flush()
+
+        for table, (scope_column, column, _, _) in seen_set_keys.items():
+            key_columns = f"{scope_column}, {column}" if scope_column else f"NULL, {column}"
+            async with await db.execute(f"SELECT {key_columns} FROM {table} ORDER BY rowid DESC LIMIT ?",
+                                        [settings.seen_set_capacity + 1]) as cursor:
+                keys = await cursor.fetchall()
+
+            seen_set = await loop.run_in_executor(None, build_seen_set, keys)
+
+            # no await from here on, so nothing is recorded between catching up and registering the set
+            for key in loading_keys.pop(table):
+                seen_set.add(*key)
+            seen_sets[table] = seen_set
+    finally:
+        loading_keys.clear()
+
+
+async def filter_unseen(db, table, column, ids, scope_column=None, scope=None):
+    """
+    Return the IDs that are not in the history table yet, in the order they were passed in.
+    Duplicates in the input are only returned once.
+    The in-memory seen-set answers first, only the IDs it is unsure about are looked up in the DB.
+
+    table, column: the history table and the column that holds the IDs.
+    scope_column, scope: optionally only look at history rows where scope_column = scope.
+    """
+
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return []
+
+    seen = set()
+    unsure_ids = ids
+    seen_set = seen_sets.get(table)
+    if seen_set:
+        unsure_ids = []
+        for entry_id in ids:
+            answer = seen_set.lookup(scope, entry_id)
+            if answer:
+                seen.add(entry_id)
+            elif answer is None:
+                unsure_ids.append(entry_id)
+
+    scope_filter = ""
+    if scope_column:
+        scope_filter = f"AND history.{scope_column} = ?"
+
+    # with no unsure IDs left this loop does not run and the DB is not touched
+    for offset in range(0, len(unsure_ids), chunk_size):
+        chunk = unsure_ids[offset:offset + chunk_size]
+        values = ", ".join(["(?)"] * len(chunk))
+        query = (f"WITH incoming(entry_id) AS (VALUES {values}) "
+                 f"SELECT entry_id FROM incoming WHERE EXISTS ("
+                 f"SELECT 1 FROM {table} AS history WHERE history.{column} = incoming.entry_id {scope_filter})")
+        parameters = list(chunk)
+        if scope_column:
+            parameters.append(scope)
+        async with await db.execute(query, parameters) as cursor:
+            seen.update(row[0] for row in await cursor.fetchall())
+
+    return [entry_id for entry_id in ids if entry_id not in seen]
+
+
+async def record_seen(db, table, rows):
+    """
+    Queue rows for a history table, they are inserted in a single transaction.
+    Rows that are already there are ignored.
+    The seen-set is updated right away, so the rows count as seen before they reach the DB.
+    """
+
+    if not rows:
+        return
+
+    placeholders = ", ".join(["?"] * len(rows[0]))
+    await db.write_many(f"INSERT OR IGNORE INTO {table} VALUES ({placeholders})", rows)
+
+    if table not in seen_set_keys:
+        return
+    _, _, scope_index, id_index = seen_set_keys[table]
+    keys = [(row[scope_index] if scope_index is not None else None, row[id_index]) for row in rows]
+
+    if table in loading_keys:
+        loading_keys[table].extend(keys)
+    seen_set = seen_sets.get(table)
+    if seen_set:
+        for key in keys:
+            seen_set.add(*key)
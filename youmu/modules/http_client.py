@@ -0,0 +1,30 @@
+import aiohttp
+
+from youmu.manifest import VERSION
+from youmu.modules import settings
+
+
+def create_session():
+    """
+    Create the long-lived HTTP session that is shared by all cogs.
+    Connections are pooled and kept alive, so repeated requests to the same host
+    do not pay for DNS, TCP and TLS every time.
+    This must be called from within a running event loop.
+    """
+
+    connector = aiohttp.TCPConnector(
+        limit=settings.http_connection_limit,
+        limit_per_host=settings.http_connection_limit_per_host,
+        ttl_dns_cache=settings.http_dns_cache_ttl,
+        keepalive_timeout=settings.http_keepalive_timeout,
+        enable_cleanup_closed=True,
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=settings.http_total_timeout,
+        sock_connect=settings.http_connect_timeout,
+        sock_read=settings.http_read_timeout,
+    )
+    headers = {
+        "User-Agent": f"Youmu/{VERSION} (+https://github.com/Kyuunex/Youmu)",
+    }
+    return aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers)
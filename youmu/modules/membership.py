@@ -0,0 +1,120 @@
+import asyncio
+import hashlib
+import sys
+from array import array
+
+
+def pack(osu_ids):
+    """
+    A roster as a compact snapshot: the sorted, unique IDs as little-endian 64-bit ints.
+    """
+
+    packed = array("q", sorted(set(int(osu_id) for osu_id in osu_ids)))
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack(packed):
+    osu_ids = array("q")
+    osu_ids.frombytes(packed)
+    if sys.byteorder == "big":
+        osu_ids.byteswap()
+    return osu_ids
+
+
+def roster_hash(packed):
+    return hashlib.blake2b(packed, digest_size=16).hexdigest()
+
+
+def diff(cached_ids, fresh_ids):
+    """
+    Compare a stored roster with a freshly scraped one.
+    IDs are compared as ints, whatever type they came in as.
+    Returns (added, removed), both sorted lists of ints.
+    """
+
+    cached_ids = set(int(osu_id) for osu_id in cached_ids)
+    fresh_ids = set(int(osu_id) for osu_id in fresh_ids)
+    return sorted(fresh_ids - cached_ids), sorted(cached_ids - fresh_ids)
+
+
+async def apply(db, group_id, packed, timestamp, added=(), removed=()):
+    """
+    Queue a group's new roster snapshot together with its entries for the change log,
+    as one batch, so they are committed in the same transaction or not at all.
+    """
+
+    await db.write_batch([
+        ("INSERT INTO groupfeed_roster_snapshots VALUES (?, ?, ?, ?) "
+         "ON CONFLICT(group_id) DO UPDATE SET "
+         "member_ids = excluded.member_ids, roster_hash = excluded.roster_hash, "
+         "timestamp = excluded.timestamp",
+         [(int(group_id), packed, roster_hash(packed), int(timestamp))]),
+        ("INSERT INTO groupfeed_change_log VALUES (?, ?, ?, ?)",
+         [(int(group_id), int(osu_id), 1, int(timestamp)) for osu_id in added] +
+         [(int(group_id), int(osu_id), 0, int(timestamp)) for osu_id in removed]),
+    ])
+
+
+class MemberInfoCache:
+    """
+    In-memory copy of groupfeed_member_info, keyed by osu_id and shared by all groups.
+    Only rows that actually changed are written back, with one batched upsert.
+    """
+
+    def __init__(self):
+        self.members = {}
+        self.loaded = False
+        self.load_lock = asyncio.Lock()
+
+    async def load(self, db):
+        """
+        Load the table once. The groups are checked at the same time and all call this on their first pass,
+        the lock makes the others wait for the first load instead of loading it again over their updates.
+        """
+
+        async with self.load_lock:
+            if self.loaded:
+                return
+            async with await db.execute("SELECT osu_id, username, country FROM groupfeed_member_info") as cursor:
+                rows = await cursor.fetchall()
+            self.members = {int(osu_id): (str(username), str(country)) for osu_id, username, country in rows}
+            self.loaded = True
+
+    def get(self, osu_id):
+        """
+        Returns (osu_id, username, country), or None if the member was never seen.
+        """
+
+        info = self.members.get(int(osu_id))
+        if not info:
+            return None
+        return (int(osu_id), *info)
+
+    async def update(self, db, fresh_entries):
+        """
+        Take usernames and countries from a scraped roster, and queue the rows that changed.
+        Returns how many rows changed.
+        """
+
+        await self.load(db)
+
+        changed_rows = []
+        for fresh_member in fresh_entries:
+            try:
+                country_code = fresh_member["country"]["code"]
+            except:
+                # thanks notbakaneko
+                country_code = "white"  # :flag_white: is a placeholder flag
+            osu_id = int(fresh_member["id"])
+            info = (str(fresh_member["username"]), str(country_code))
+            if self.members.get(osu_id) != info:
+                self.members[osu_id] = info
+                changed_rows.append((osu_id, *info))
+
+        await db.write_many("INSERT INTO groupfeed_member_info VALUES (?, ?, ?) "
+                            "ON CONFLICT(osu_id) DO UPDATE SET "
+                            "username = excluded.username, country = excluded.country",
+                            changed_rows)
+        return len(changed_rows)
@@ -0,0 +1,229 @@
+"""
+In-process metrics, served in the Prometheus text format.
+Metrics are defined at the bottom of this module and updated from anywhere in the bot.
+The HTTP endpoint is opt-in, see start_server.
+"""
+
+import asyncio
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from aiohttp import web
+
+default_buckets = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f"{name}=\"{escape_label_value(value)}\"" for name, value in pairs) + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        registry.register(self)
+
+    def key(self, labelvalues):
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes the labels {self.labelnames}")
+        return tuple(str(value) for value in labelvalues)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labelvalues, amount=1):
+        key = self.key(labelvalues)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, *labelvalues):
+        return self.values.get(self.key(labelvalues), 0)
+
+    def samples(self):
+        for key, value in sorted(self.values.items()):
+            yield f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}"
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.function = None
+
+    def set(self, value, *labelvalues):
+        self.values[self.key(labelvalues)] = value
+
+    def set_function(self, function):
+        """
+        Read the value from function() every time the metrics are rendered. Only for gauges without labels.
+        """
+
+        self.function = function
+
+    def get(self, *labelvalues):
+        if self.function:
+            return self.function()
+        return self.values.get(self.key(labelvalues), 0)
+
+    def samples(self):
+        if self.function:
+            yield f"{self.name} {format_value(self.function())}"
+            return
+        for key, value in sorted(self.values.items()):
+            yield f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=default_buckets):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, *labelvalues):
+        key = self.key(labelvalues)
+        if key not in self.values:
+            # per bucket counts (not cumulative), sum, count
+            self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+        bucket_counts, _, _ = state = self.values[key]
+        bucket_counts[bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    @contextmanager
+    def time(self, *labelvalues):
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started_at, *labelvalues)
+
+    def count(self, *labelvalues):
+        state = self.values.get(self.key(labelvalues))
+        return state[2] if state else 0
+
+    def samples(self):
+        for key, (bucket_counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for upper_bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                labels = format_labels(self.labelnames, key, [("le", format_value(upper_bound))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{format_labels(self.labelnames, key)} {format_value(total)}"
+            yield f"{self.name}_count{format_labels(self.labelnames, key)} {count}"
+
+
+class InstrumentedClient:
+    """
+    Wraps an API client (aioosuapi, aioosuwebapi) so the latency and the exceptions
+    of every coroutine method call are recorded under the given upstream name.
+    Everything else is passed through.
+    """
+
+    def __init__(self, client, upstream):
+        self.client = client
+        self.upstream = upstream
+
+    def __getattr__(self, name):
+        attribute = getattr(self.client, name)
+        if name.startswith("_") or not asyncio.iscoroutinefunction(attribute):
+            return attribute
+
+        async def instrumented(*args, **kwargs):
+            started_at = time.monotonic()
+            try:
+                return await attribute(*args, **kwargs)
+            except Exception:
+                upstream_errors.inc(self.upstream, name)
+                raise
+            finally:
+                upstream_request_seconds.observe(time.monotonic() - started_at, self.upstream, name)
+
+        return instrumented
+
+
+async def handle_metrics(request):
+    return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+
+async def start_server(host, port):
+    """
+    Serve the metrics on http://host:port/metrics. Returns the runner, call runner.cleanup() to stop it.
+    """
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+loop_pass_seconds = Histogram("youmu_loop_pass_seconds",
+                              "How long one pass of a background loop took",
+                              ["loop"])
+upstream_request_seconds = Histogram("youmu_upstream_request_seconds",
+                                     "Latency of requests to osu! and RSS feeds",
+                                     ["upstream", "method"])
+upstream_errors = Counter("youmu_upstream_errors_total",
+                          "Requests to osu! and RSS feeds that failed",
+                          ["upstream", "method"])
+db_rows_read = Counter("youmu_db_rows_read_total",
+                       "Rows fetched from the database")
+db_rows_written = Counter("youmu_db_rows_written_total",
+                          "Rows inserted, updated or deleted in the database")
+db_commits = Counter("youmu_db_commits_total",
+                     "Database commits")
+messages_sent = Counter("youmu_messages_sent_total",
+                        "Feed posts sent, per channel",
+                        ["channel"])
+messages_failed = Counter("youmu_messages_failed_total",
+                          "Feed posts that could not be sent, per channel",
+                          ["channel"])
+dispatch_queue_depth = Gauge("youmu_dispatch_queue_depth",
+                             "Feed posts waiting to be sent")
+startup_phase_seconds = Gauge("youmu_startup_phase_seconds",
+                              "How long each phase of the last startup took",
+                              ["phase"])
@@ -0,0 +1,251 @@
+"""
+Versioned schema migrations.
+The schema version is kept in the database header (PRAGMA user_version).
+Each migration runs in its own transaction, so a database is never left half-upgraded.
+Migrations are append-only: never edit one that has been released, add a new one instead.
+A migration step is either an SQL statement or a function that takes the sqlite3 connection.
+"""
+
+import time
+
+from youmu.modules import membership
+
+
+def snapshot_group_members(conn):
+    # one packed snapshot per group from the old one-row-per-member table
+    rosters = {}
+    for osu_id, group_id in conn.execute("SELECT osu_id, group_id FROM groupfeed_group_members").fetchall():
+        rosters.setdefault(int(group_id), []).append(osu_id)
+
+    for group_id, osu_ids in rosters.items():
+        packed = membership.pack(osu_ids)
+        conn.execute("INSERT OR REPLACE INTO groupfeed_roster_snapshots VALUES (?, ?, ?, ?)",
+                     [group_id, packed, membership.roster_hash(packed), int(time.time())])
+
+
+migrations = [
+    # 1: the original schema
+    [
+        """
+        CREATE TABLE IF NOT EXISTS "admins" (
+            "user_id"    INTEGER NOT NULL UNIQUE,
+            "permissions"    INTEGER NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS "config" (
+            "setting"    TEXT,
+            "parent"    TEXT,
+            "value"    TEXT,
+            "flag"    TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS "ignored_users" (
+            "user_id"    INTEGER NOT NULL UNIQUE,
+            "reason"    TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS "channels" (
+            "setting"    TEXT NOT NULL,
+            "guild_id"    INTEGER NOT NULL,
+            "channel_id"    INTEGER NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS "groupfeed_channel_list" (
+            "channel_id"    INTEGER NOT NULL UNIQUE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS "groupfeed_group_members" (
+            "osu_id"    INTEGER NOT NULL,
+            "group_id"    INTEGER NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS "groupfeed_member_info" (
+            "osu_id"    INTEGER NOT NULL UNIQUE,
+            "username"    TEXT NOT NULL,
+            "country"    TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS "rankfeed_channel_list" (
+            "channel_id"    INTEGER NOT NULL UNIQUE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS "rankfeed_history" (
+            "mapset_id"    INTEGER NOT NULL UNIQUE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS "rssfeed_channels" (
+            "url"    TEXT NOT NULL,
+            "channel_id"    INTEGER NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS "rssfeed_history" (
+            "url"    TEXT NOT NULL,
+            "entry_id"    TEXT NOT NULL UNIQUE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS "rssfeed_tracklist" (
+            "url"    TEXT NOT NULL UNIQUE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS "rssfeed_fetch_state" (
+            "url"    TEXT NOT NULL UNIQUE,
+            "etag"    TEXT,
+            "last_modified"    TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS "usereventfeed_channels" (
+            "osu_id"    INTEGER NOT NULL,
+            "channel_id"    INTEGER NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS "usereventfeed_history" (
+            "osu_id"    INTEGER NOT NULL,
+            "event_id"    INTEGER NOT NULL UNIQUE,
+            "timestamp"    INTEGER NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS "usereventfeed_tracklist" (
+            "osu_id"    INTEGER NOT NULL UNIQUE
+        )
+        """,
+    ],
+    # 2: indexes for the hot lookups, and history uniqueness per feed instead of globally
+    [
+        """
+        CREATE TABLE "rssfeed_history_new" (
+            "url"    TEXT NOT NULL,
+            "entry_id"    TEXT NOT NULL,
+            UNIQUE ("url", "entry_id")
+        )
+        """,
+        """
+        INSERT OR IGNORE INTO "rssfeed_history_new" SELECT "url", "entry_id" FROM "rssfeed_history"
+        """,
+        """
+        DROP TABLE "rssfeed_history"
+        """,
+        """
+        ALTER TABLE "rssfeed_history_new" RENAME TO "rssfeed_history"
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS "rssfeed_channels_url" ON "rssfeed_channels" ("url", "channel_id")
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS "usereventfeed_channels_osu_id"
+        ON "usereventfeed_channels" ("osu_id", "channel_id")
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS "groupfeed_group_members_group_id"
+        ON "groupfeed_group_members" ("group_id", "osu_id")
+        """,
+    ],
+    # 3: adaptive RSS polling interval per feed
+    [
+        """
+        ALTER TABLE "rssfeed_fetch_state" ADD COLUMN "poll_interval" INTEGER
+        """,
+    ],
+    # 4: what the history retention needs
+    [
+        """
+        ALTER TABLE "rssfeed_fetch_state" ADD COLUMN "entry_count" INTEGER
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS "usereventfeed_history_timestamp" ON "usereventfeed_history" ("timestamp")
+        """,
+    ],
+    # 5: bytes downloaded per feed, to find the heavy ones
+    [
+        """
+        ALTER TABLE "rssfeed_fetch_state" ADD COLUMN "last_bytes" INTEGER
+        """,
+        """
+        ALTER TABLE "rssfeed_fetch_state" ADD COLUMN "total_bytes" INTEGER
+        """,
+    ],
+    # 6: GroupFeed rosters as compact snapshots, plus a log of membership changes
+    [
+        """
+        CREATE TABLE IF NOT EXISTS "groupfeed_roster_snapshots" (
+            "group_id"    INTEGER NOT NULL UNIQUE,
+            "member_ids"    BLOB NOT NULL,
+            "roster_hash"    TEXT NOT NULL,
+            "timestamp"    INTEGER NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS "groupfeed_change_log" (
+            "group_id"    INTEGER NOT NULL,
+            "osu_id"    INTEGER NOT NULL,
+            "added"    INTEGER NOT NULL,
+            "timestamp"    INTEGER NOT NULL
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS "groupfeed_change_log_group_id_timestamp"
+        ON "groupfeed_change_log" ("group_id", "timestamp")
+        """,
+        snapshot_group_members,
+        """
+        DROP TABLE IF EXISTS "groupfeed_group_members"
+        """,
+    ],
+]
+
+latest_version = len(migrations)
+
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def upgrade(conn):
+    """
+    Bring a sqlite3 connection's database up to the latest schema version.
+    Returns the list of versions that were applied.
+    """
+
+    # the caller may keep using the connection, so leave it the way it was found
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    current_version = get_version(conn)
+    applied = []
+
+    try:
+        for version, statements in enumerate(migrations, start=1):
+            if version <= current_version:
+                continue
+
+            conn.execute("BEGIN")
+            try:
+                for statement in statements:
+                    if callable(statement):
+                        statement(conn)
+                    else:
+                        conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {version}")
+                conn.execute("COMMIT")
+            except:
+                conn.execute("ROLLBACK")
+                raise
+
+            applied.append(version)
+    finally:
+        conn.isolation_level = isolation_level
+
+    return applied
@@ -1,55 +1,60 @@
-from youmu.modules.storage_management import database_file
-import sqlite3
+class PermissionCache:
+    """
+    In-memory sets of bot admins, owners and ignored users, checked on every command.
+    It is loaded from the database at startup and kept up to date by the commands that change permissions,
+    so a change applies right away. load() can be called again to pick up edits made behind its back.
+    """
 
-admin_list = []
-owner_list = []
-ignored_users = []
+    def __init__(self):
+        self.admins = set()
+        self.owners = set()
+        self.ignored = set()
 
+    async def load(self, db):
+        async with db.execute("SELECT user_id, permissions FROM admins") as cursor:
+            db_admin_list = await cursor.fetchall()
+        async with db.execute("SELECT user_id FROM ignored_users") as cursor:
+            db_ignored_users = await cursor.fetchall()
 
-def fetch_users_from_db():
-    conn = sqlite3.connect(database_file)
-    c = conn.cursor()
-    db_admin_list = tuple(c.execute("SELECT user_id FROM admins"))
-    db_owner_list = tuple(c.execute("SELECT user_id FROM admins WHERE permissions = ?", [1]))
-    db_ignored_users = tuple(c.execute("SELECT user_id FROM ignored_users"))
-    conn.commit()
-    conn.close()
+        # swapped in whole, so a check never sees a half loaded cache
+        self.admins = {int(user_id) for user_id, _ in db_admin_list}
+        self.owners = {int(user_id) for user_id, perms in db_admin_list if int(perms) == 1}
+        self.ignored = {int(user_id) for user_id, in db_ignored_users}
 
-    for admin_id in db_admin_list:
-        admin_list.append(int(admin_id[0]))
+    def add_admin(self, user_id, owner=False):
+        self.admins.add(int(user_id))
+        if owner:
+            self.owners.add(int(user_id))
 
-    for owner_id in db_owner_list:
-        owner_list.append(int(owner_id[0]))
+    def ignore(self, user_id):
+        self.ignored.add(int(user_id))
 
-    for ignored_user in db_ignored_users:
-        ignored_users.append(int(ignored_user[0]))
 
-
-fetch_users_from_db()
+cache = PermissionCache()
 
 
 async def is_admin(ctx):
-    return int(ctx.author.id) in admin_list
+    return int(ctx.author.id) in cache.admins
 
 
 async def is_owner(ctx):
-    return int(ctx.author.id) in owner_list
+    return int(ctx.author.id) in cache.owners
 
 
 async def is_not_ignored(ctx):
-    return not (int(ctx.author.id) in ignored_users)
+    return int(ctx.author.id) not in cache.ignored
 
 
 async def is_ignored(ctx):
-    return int(ctx.author.id) in ignored_users
+    return int(ctx.author.id) in cache.ignored
 
 
 def check_admin(user_id):
-    return int(user_id) in admin_list
+    return int(user_id) in cache.admins
 
 
 def check_owner(user_id):
-    return int(user_id) in owner_list
+    return int(user_id) in cache.owners
 
 
 async def channel_ban_members(ctx):
@@ -0,0 +1,35 @@
+import asyncio
+import time
+
+
+class RateLimiter:
+    """
+    Token bucket. Allows bursts of up to `rate` calls, refilled at `rate` calls per `per` seconds.
+    """
+
+    def __init__(self, rate, per):
+        self.rate = rate
+        self.per = per
+        self.tokens = float(rate)
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated_at) * self.rate / self.per)
+        self.updated_at = now
+
+    async def acquire(self):
+        async with self.lock:
+            self.refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) * self.per / self.rate)
+                self.refill()
+            self.tokens -= 1
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
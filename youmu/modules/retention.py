@@ -0,0 +1,107 @@
+import time
+
+from youmu.modules import settings
+
+
+class RetentionReport:
+    def __init__(self):
+        self.pruned_rows = {}
+        self.file_bytes_before = 0
+        self.file_bytes_after = 0
+        self.free_bytes_before = 0
+        self.free_bytes = 0
+        self.duration = 0.0
+
+    @property
+    def total_pruned_rows(self):
+        return sum(self.pruned_rows.values())
+
+    @property
+    def reclaimed_bytes(self):
+        """
+        Space that pruning freed up, whether it was given back to the OS or is now free pages inside the file.
+        Without incremental auto vacuum (see db_vacuum) the file does not shrink, the pages are reused instead.
+        """
+
+        return (self.file_bytes_before - self.free_bytes_before) - (self.file_bytes_after - self.free_bytes)
+
+
+async def database_bytes(db):
+    async with await db.execute("PRAGMA page_size") as cursor:
+        page_size = (await cursor.fetchone())[0]
+    async with await db.execute("PRAGMA page_count") as cursor:
+        page_count = (await cursor.fetchone())[0]
+    async with await db.execute("PRAGMA freelist_count") as cursor:
+        freelist_count = (await cursor.fetchone())[0]
+    return page_count * page_size, freelist_count * page_size
+
+
+async def prune_usereventfeed_history(db, now):
+    # events are fetched with event_days=2, anything much older than that can never come back
+    cutoff = int(now) - settings.uef_history_retention_days * 86400
+    cursor = await db.execute("DELETE FROM usereventfeed_history WHERE timestamp < ?", [cutoff])
+    return cursor.rowcount
+
+
+async def prune_rssfeed_history(db):
+    """
+    Keep the newest entries of each feed, a window a few times larger than the feed itself,
+    so an entry is never forgotten while the feed still lists it.
+    History of feeds that are no longer tracked is dropped.
+    """
+
+    cursor = await db.execute("DELETE FROM rssfeed_history WHERE url NOT IN (SELECT url FROM rssfeed_tracklist)")
+    pruned_rows = cursor.rowcount
+
+    async with await db.execute("SELECT rssfeed_tracklist.url, rssfeed_fetch_state.entry_count "
+                                "FROM rssfeed_tracklist LEFT JOIN rssfeed_fetch_state "
+                                "ON rssfeed_tracklist.url = rssfeed_fetch_state.url") as cursor:
+        feeds = await cursor.fetchall()
+
+    for url, entry_count in feeds:
+        window = max(settings.rss_history_min_window, settings.rss_history_window_factor * (entry_count or 0))
+        cursor = await db.execute("DELETE FROM rssfeed_history WHERE url = ? AND rowid NOT IN ("
+                                  "SELECT rowid FROM rssfeed_history WHERE url = ? ORDER BY rowid DESC LIMIT ?)",
+                                  [str(url), str(url), int(window)])
+        pruned_rows += cursor.rowcount
+
+    return pruned_rows
+
+
+async def prune_rankfeed_history(db):
+    # the ranked listing only ever shows the latest few dozen sets
+    cursor = await db.execute("DELETE FROM rankfeed_history WHERE rowid NOT IN ("
+                              "SELECT rowid FROM rankfeed_history ORDER BY rowid DESC LIMIT ?)",
+                              [settings.rankfeed_history_window])
+    return cursor.rowcount
+
+
+async def run(db, now=None):
+    """
+    Prune all history tables in one transaction, then give the space back and refresh planner statistics.
+    Returns a RetentionReport.
+    """
+
+    if now is None:
+        now = time.time()
+    started_at = time.monotonic()
+    report = RetentionReport()
+    await db.flush()
+    report.file_bytes_before, report.free_bytes_before = await database_bytes(db)
+
+    report.pruned_rows["usereventfeed_history"] = await prune_usereventfeed_history(db, now)
+    report.pruned_rows["rssfeed_history"] = await prune_rssfeed_history(db)
+    report.pruned_rows["rankfeed_history"] = await prune_rankfeed_history(db)
+    await db.flush()
+
+    if report.total_pruned_rows:
+        # only shrinks the file when auto_vacuum is INCREMENTAL, otherwise the pages are reused later
+        async with await db.execute("PRAGMA incremental_vacuum") as cursor:
+            await cursor.fetchall()
+        await db.execute("PRAGMA analysis_limit = 1000")
+        await db.execute("ANALYZE")
+        await db.flush()
+
+    report.file_bytes_after, report.free_bytes = await database_bytes(db)
+    report.duration = time.monotonic() - started_at
+    return report
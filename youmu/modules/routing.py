@@ -0,0 +1,56 @@
+class SubscriptionRouter:
+    """
+    In-memory index of where each feed is posted: (feed type, feed key) -> set of channel IDs.
+    It is loaded from the database once at startup and kept up to date by the commands
+    that change subscriptions, so the background loops never query the DB to find their channels.
+
+    Feed types and their keys:
+    rss: feed url, uef: osu! user id, rankfeed and groupfeed: None
+    """
+
+    def __init__(self):
+        self.routes = {}
+
+    async def load(self, db):
+        self.routes = {}
+
+        async with await db.execute("SELECT url, channel_id FROM rssfeed_channels") as cursor:
+            for url, channel_id in await cursor.fetchall():
+                self.add("rss", str(url), channel_id)
+
+        async with await db.execute("SELECT osu_id, channel_id FROM usereventfeed_channels") as cursor:
+            for osu_id, channel_id in await cursor.fetchall():
+                self.add("uef", int(osu_id), channel_id)
+
+        async with await db.execute("SELECT channel_id FROM rankfeed_channel_list") as cursor:
+            for channel_id, in await cursor.fetchall():
+                self.add("rankfeed", None, channel_id)
+
+        async with await db.execute("SELECT channel_id FROM groupfeed_channel_list") as cursor:
+            for channel_id, in await cursor.fetchall():
+                self.add("groupfeed", None, channel_id)
+
+    def channels(self, feed_type, key=None):
+        return set(self.routes.get((feed_type, key), ()))
+
+    def add(self, feed_type, key, channel_id):
+        self.routes.setdefault((feed_type, key), set()).add(int(channel_id))
+
+    def remove(self, feed_type, key, channel_id):
+        channels = self.routes.get((feed_type, key))
+        if channels is None:
+            return
+        channels.discard(int(channel_id))
+        if not channels:
+            del self.routes[(feed_type, key)]
+
+    def remove_key(self, feed_type, key):
+        self.routes.pop((feed_type, key), None)
+
+    def remove_channel(self, feed_type, channel_id):
+        """
+        Remove a channel from every feed of a type, for example after the channel was deleted.
+        """
+
+        for route in [route for route in self.routes if route[0] == feed_type]:
+            self.remove(route[0], route[1], channel_id)
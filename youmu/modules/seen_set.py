@@ -0,0 +1,82 @@
+import hashlib
+from array import array
+from bisect import bisect_left
+
+
+def key_hash(*parts):
+    """
+    64-bit hash of a history key. The parts are joined, so (url, entry_id) hashes differently per feed.
+    """
+
+    digest = hashlib.blake2b("\0".join(str(part) for part in parts).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+class SeenSet:
+    """
+    Compact in-memory copy of a history table: 8 bytes per entry in a sorted array,
+    plus a small set of recent additions that is merged into the array in batches.
+
+    lookup() answers True (seen), False (definitely not seen) or None (maybe, ask the DB).
+    As long as the whole table fits in `capacity`, every answer is definite.
+    Once entries had to be left out, "not found" becomes a maybe, and the DB stays the source of truth.
+    A 64-bit hash collision could make an unseen ID look seen, at odds of about n / 2^64.
+    """
+
+    def __init__(self, capacity, merge_threshold=1024):
+        self.capacity = capacity
+        self.merge_threshold = merge_threshold
+        self.hashes = array("q")
+        self.recent = set()
+        self.complete = True
+
+    def load(self, keys, complete):
+        """
+        keys: iterable of key tuples
+        complete: whether keys is the whole history table
+        """
+
+        self.hashes = array("q", sorted(set(key_hash(*key) for key in keys)))
+        self.recent = set()
+        self.complete = complete
+        self.trim()
+
+    def __len__(self):
+        return len(self.hashes) + len(self.recent)
+
+    def __contains__(self, hashed):
+        if hashed in self.recent:
+            return True
+        position = bisect_left(self.hashes, hashed)
+        return position < len(self.hashes) and self.hashes[position] == hashed
+
+    def lookup(self, *parts):
+        if key_hash(*parts) in self:
+            return True
+        if self.complete:
+            return False
+        return None
+
+    def add(self, *parts):
+        hashed = key_hash(*parts)
+        if hashed in self:
+            return
+        self.recent.add(hashed)
+        if len(self.recent) >= self.merge_threshold:
+            self.merge()
+
+    def merge(self):
+        self.hashes = array("q", sorted(self.hashes.tolist() + list(self.recent)))
+        self.recent = set()
+        self.trim()
+
+    def trim(self):
+        if len(self.hashes) <= self.capacity:
+            return
+        # there is no age information in a hash, so drop evenly spaced entries,
+        # which is an unbiased sample since the hashes are uniform
+        surplus = len(self.hashes) - self.capacity
+        step = len(self.hashes) / surplus
+        dropped = set(int(index * step) for index in range(surplus))
+        self.hashes = array("q", (hashed for index, hashed in enumerate(self.hashes) if index not in dropped))
+        self.complete = False
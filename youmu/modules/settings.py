@@ -0,0 +1,88 @@
+import os
+
+
+def env_int(name, default):
+    if os.environ.get(name):
+        return int(os.environ.get(name))
+    return default
+
+
+def env_str(name, default):
+    return os.environ.get(name) or default
+
+
+def env_float(name, default):
+    if os.environ.get(name):
+        return float(os.environ.get(name))
+    return default
+
+
+# Shared HTTP client
+http_connection_limit = env_int("YOUMU_HTTP_CONNECTION_LIMIT", 100)
+http_connection_limit_per_host = env_int("YOUMU_HTTP_CONNECTION_LIMIT_PER_HOST", 4)
+http_dns_cache_ttl = env_int("YOUMU_HTTP_DNS_CACHE_TTL", 600)
+http_keepalive_timeout = env_float("YOUMU_HTTP_KEEPALIVE_TIMEOUT", 60)
+http_connect_timeout = env_float("YOUMU_HTTP_CONNECT_TIMEOUT", 10)
+http_read_timeout = env_float("YOUMU_HTTP_READ_TIMEOUT", 20)
+http_total_timeout = env_float("YOUMU_HTTP_TOTAL_TIMEOUT", 30)
+
+# RSSFeed polling
+rss_poll_workers = env_int("YOUMU_RSS_POLL_WORKERS", 16)
+rss_poll_workers_per_host = env_int("YOUMU_RSS_POLL_WORKERS_PER_HOST", 2)
+rss_min_poll_interval = env_int("YOUMU_RSS_MIN_POLL_INTERVAL", 300)
+rss_max_poll_interval = env_int("YOUMU_RSS_MAX_POLL_INTERVAL", 86400)
+rss_default_poll_interval = env_int("YOUMU_RSS_DEFAULT_POLL_INTERVAL", 1200)
+rss_scheduler_tick = env_int("YOUMU_RSS_SCHEDULER_TICK", 300)
+
+# RSSFeed downloads
+rss_max_download_bytes = env_int("YOUMU_RSS_MAX_DOWNLOAD_BYTES", 5000000)
+rss_download_chunk_size = env_int("YOUMU_RSS_DOWNLOAD_CHUNK_SIZE", 65536)
+# a download is accepted if its Content-Type contains one of these, or if it has none
+rss_content_types = env_str("YOUMU_RSS_CONTENT_TYPES", "xml,rss,atom,text/plain").split(",")
+
+# RSSFeed parsing, "process" or "thread"
+rss_parser_executor = env_str("YOUMU_RSS_PARSER_EXECUTOR", "process")
+rss_parser_workers = env_int("YOUMU_RSS_PARSER_WORKERS", 2)
+rss_parse_timeout = env_float("YOUMU_RSS_PARSE_TIMEOUT", 10)
+rss_max_parse_bytes = env_int("YOUMU_RSS_MAX_PARSE_BYTES", 5000000)
+rss_seen_run_length = env_int("YOUMU_RSS_SEEN_RUN_LENGTH", 3)
+rss_full_parse_every = env_int("YOUMU_RSS_FULL_PARSE_EVERY", 10)
+
+# Feed post dispatcher
+dispatch_channel_rate = env_int("YOUMU_DISPATCH_CHANNEL_RATE", 5)
+dispatch_channel_per = env_float("YOUMU_DISPATCH_CHANNEL_PER", 5)
+dispatch_global_rate = env_int("YOUMU_DISPATCH_GLOBAL_RATE", 45)
+dispatch_idle_timeout = env_float("YOUMU_DISPATCH_IDLE_TIMEOUT", 60)
+
+# osu! web API quota, shared by all cogs
+osuweb_rate = env_int("YOUMU_OSUWEB_RATE", 60)
+osuweb_per = env_float("YOUMU_OSUWEB_PER", 60)
+
+# osu! API caches
+beatmapset_cache_size = env_int("YOUMU_BEATMAPSET_CACHE_SIZE", 2000)
+beatmapset_cache_ttl = env_float("YOUMU_BEATMAPSET_CACHE_TTL", 600)
+
+# UserEventFeed polling
+uef_check_workers = env_int("YOUMU_UEF_CHECK_WORKERS", 8)
+uef_untrack_after_misses = env_int("YOUMU_UEF_UNTRACK_AFTER_MISSES", 3)
+
+# History retention
+history_retention_interval = env_int("YOUMU_HISTORY_RETENTION_INTERVAL", 86400)
+uef_history_retention_days = env_int("YOUMU_UEF_HISTORY_RETENTION_DAYS", 14)
+rss_history_min_window = env_int("YOUMU_RSS_HISTORY_MIN_WINDOW", 200)
+rss_history_window_factor = env_int("YOUMU_RSS_HISTORY_WINDOW_FACTOR", 3)
+rankfeed_history_window = env_int("YOUMU_RANKFEED_HISTORY_WINDOW", 5000)
+
+# In-memory history seen-sets, 8 bytes per entry
+seen_set_capacity = env_int("YOUMU_SEEN_SET_CAPACITY", 1000000)
+
+# Metrics endpoint, disabled when the port is 0
+metrics_host = env_str("YOUMU_METRICS_HOST", "127.0.0.1")
+metrics_port = env_int("YOUMU_METRICS_PORT", 0)
+
+# Runs the background loops this many times faster than real time, only for simulations
+clock_speed = env_float("YOUMU_CLOCK_SPEED", 1)
+
+# Database group commit
+db_commit_delay = env_float("YOUMU_DB_COMMIT_DELAY", 0.5)
+db_commit_batch = env_int("YOUMU_DB_COMMIT_BATCH", 500)
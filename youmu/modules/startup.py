@@ -0,0 +1,34 @@
+import time
+
+from youmu.modules import metrics
+
+
+class StartupTimer:
+    """
+    Times the phases of a startup, from importing the bot up to on_ready,
+    so a slow restart can be traced back to the phase that caused it.
+    Phase timings are also exported as the youmu_startup_phase_seconds metric.
+    """
+
+    def __init__(self, started_at=None):
+        self.started_at = started_at or time.perf_counter()
+        self.phase_started_at = self.started_at
+        self.phases = []
+
+    def phase(self, name):
+        """
+        Ends the current phase under the given name and starts the next one.
+        """
+
+        now = time.perf_counter()
+        seconds = now - self.phase_started_at
+        self.phase_started_at = now
+        self.phases.append((name, seconds))
+        metrics.startup_phase_seconds.set(seconds, name)
+
+    def report(self):
+        buffer = "Startup timing:\n"
+        for name, seconds in self.phases:
+            buffer += f"  {name:14} {seconds * 1000:9.1f} ms\n"
+        buffer += f"  {'total':14} {(self.phase_started_at - self.started_at) * 1000:9.1f} ms"
+        return buffer